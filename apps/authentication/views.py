@@ -13,6 +13,7 @@ import string
 import requests
 from datetime import timedelta
 from django.utils import timezone
+from shop.cart import merge_guest_cart
 
 from .models import User
 from .serializers import (
@@ -183,6 +184,8 @@ def verify_view(request):
             }
         }, status=status.HTTP_400_BAD_REQUEST)
 
+    merge_guest_cart(user, request.headers.get('X-Cart-Token'))
+
     refresh = RefreshToken.for_user(user)
     access_token = refresh.access_token
 
@@ -226,6 +229,8 @@ def login_view(request):
             }
         }, status=status.HTTP_401_UNAUTHORIZED)
 
+    merge_guest_cart(user, request.headers.get('X-Cart-Token'))
+
     refresh = RefreshToken.for_user(user)
     access_token = refresh.access_token
 
@@ -1,8 +1,11 @@
 from django.contrib import admin
+from modeltranslation.admin import TranslationAdmin
 from .models import *
+from . import services
+from .order_export import orders_export_response
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
+class CategoryAdmin(TranslationAdmin):
     list_display = ['name', 'slug', 'created_at']
     prepopulated_fields = {'slug': ('name',)}
 
@@ -11,10 +14,14 @@ class ProductImageInline(admin.TabularInline):
     extra = 1
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
-    list_display = ['title', 'category', 'price', 'in_stock', 'created_at']
-    list_filter = ['category', 'in_stock', 'created_at']
-    search_fields = ['title', 'description']
+class ProductAdmin(TranslationAdmin):
+    list_display = ['title', 'category', 'price', 'stock', 'reserved', 'created_at']
+    list_filter = ['category', 'created_at']
+    search_fields = ['sku', 'title', 'description']
+    readonly_fields = [
+        'reserved', 'rating_sum', 'reviews_count', 'likes_count',
+        'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count'
+    ]
     inlines = [ProductImageInline]
 
 @admin.register(Cart)
@@ -22,12 +29,48 @@ class CartAdmin(admin.ModelAdmin):
     list_display = ['user', 'items_count', 'total', 'created_at']
     readonly_fields = ['total', 'items_count']
 
+def transition_action(to_status):
+    def action(modeladmin, request, queryset):
+        result = services.transition_orders(
+            queryset.values_list('pk', flat=True), to_status, changed_by=request.user
+        )
+        modeladmin.message_user(
+            request,
+            f"{len(result['updated'])} orders marked as {to_status}, {len(result['rejected'])} skipped"
+        )
+
+    action.__name__ = f'mark_{to_status}'
+    action.short_description = f"Mark selected orders as {to_status}"
+    return action
+
+def export_action(format):
+    def action(modeladmin, request, queryset):
+        return orders_export_response(queryset, format)
+
+    action.__name__ = f'export_{format}'
+    action.short_description = f"Export selected orders as {format.upper()}"
+    return action
+
+class OrderStatusHistoryInline(admin.TabularInline):
+    model = OrderStatusHistory
+    extra = 0
+    can_delete = False
+    readonly_fields = ['from_status', 'to_status', 'tracking_number', 'changed_by', 'created_at']
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['order_number', 'user', 'status', 'total', 'created_at']
     list_filter = ['status', 'created_at']
     search_fields = ['order_number', 'user__username']
-    readonly_fields = ['order_number', 'total']
+    # Status only changes through the transition actions so every change is validated and recorded
+    readonly_fields = ['order_number', 'status', 'tracking_number', 'total']
+    inlines = [OrderStatusHistoryInline]
+    actions = [transition_action(status) for status in ['processing', 'shipped', 'delivered', 'cancelled']] + [
+        export_action('csv'), export_action('jsonl')
+    ]
 
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
@@ -0,0 +1,45 @@
+import hashlib
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import get_language
+
+CATALOG_VERSION_KEY = 'shop:catalog:version'
+
+
+def get_catalog_version():
+    return cache.get_or_set(CATALOG_VERSION_KEY, 1, timeout=None)
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog response by moving to a new key version"""
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, 1, timeout=None)
+
+
+def invalidate_catalog():
+    # Bump after commit so a concurrent miss cannot re-cache the old rows
+    transaction.on_commit(bump_catalog_version)
+
+
+def normalize_query_params(query_params):
+    # Keys are sorted, but repeated values keep their order: DRF filters read the last one
+    return urlencode(sorted(query_params.lists()), doseq=True)
+
+
+def catalog_cache_key(name, query_params=None, **parts):
+    signature = normalize_query_params(query_params) if query_params is not None else ''
+    signature += '|' + '|'.join(f"{key}={value}" for key, value in sorted(parts.items()))
+    digest = hashlib.md5(signature.encode()).hexdigest()
+    return f"shop:catalog:v{get_catalog_version()}:{name}:{get_language()}:{digest}"
+
+
+def get_cached(key):
+    return cache.get(key)
+
+
+def set_cached(key, data):
+    cache.set(key, data, timeout=getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300))
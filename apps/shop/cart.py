@@ -0,0 +1,274 @@
+import logging
+import uuid
+from decimal import Decimal
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.utils.module_loading import import_string
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from . import services
+from .cache import get_catalog_version
+from .models import Cart, CartItem, Product
+from .serializers import CartProductSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def get_product_snapshots(product_ids):
+    """CartProductSerializer data per product id, cached under the catalog version"""
+    version = get_catalog_version()
+    keys = {product_id: f'shop:cart-product:v{version}:{product_id}' for product_id in product_ids}
+    cached = cache.get_many(keys.values())
+    snapshots = {
+        product_id: cached[key] for product_id, key in keys.items() if key in cached
+    }
+
+    missing = [product_id for product_id in product_ids if product_id not in snapshots]
+    if missing:
+        products = Product.objects.filter(pk__in=missing).for_listing()
+        fresh = {product.pk: CartProductSerializer(product).data for product in products}
+        cache.set_many(
+            {keys[product_id]: data for product_id, data in fresh.items()},
+            timeout=getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+        )
+        snapshots.update(fresh)
+    return snapshots
+
+
+def summarize(rows):
+    """Build the cart response ({items, total, items_count}) from (product data, price, quantity) rows in one pass"""
+    items = []
+    total = 0
+    items_count = 0
+    for product, price, quantity in rows:
+        subtotal = price * quantity
+        items.append({'product': product, 'quantity': quantity, 'subtotal': subtotal})
+        total += subtotal
+        items_count += quantity
+    return {'items': items, 'total': total, 'items_count': items_count}
+
+
+def render_lines(lines):
+    """Render {product_id: quantity} in the cart response shape"""
+    snapshots = get_product_snapshots(list(lines))
+    return summarize(
+        (snapshots[product_id], Decimal(snapshots[product_id]['price']), quantity)
+        for product_id, quantity in lines.items() if product_id in snapshots
+    )
+
+
+def render_cart_items(cart_items):
+    """Render CartItems loaded with CartItemQuerySet.with_products() in the cart response shape"""
+    products = CartProductSerializer([cart_item.product for cart_item in cart_items], many=True).data
+    return summarize(
+        (product, cart_item.product.price, cart_item.quantity)
+        for cart_item, product in zip(cart_items, products)
+    )
+
+
+class DatabaseCartStorage:
+    """Cart lines stored directly in Cart/CartItem"""
+
+    def add(self, user, lines):
+        cart, created = Cart.objects.get_or_create(user_id=user.pk)
+        CartItem.objects.add_quantities(cart.pk, lines)
+
+    def remove(self, user, product_id):
+        return CartItem.objects.filter(cart__user=user, product_id=product_id).delete()[0] > 0
+
+    def clear(self, user):
+        CartItem.objects.filter(cart__user=user).delete()
+
+    def render(self, user):
+        return render_cart_items(list(
+            CartItem.objects.filter(cart__user=user).with_products().order_by('pk')
+        ))
+
+    def persist(self, user_id):
+        pass
+
+    def flush_dirty(self, batch_size=500):
+        return 0
+
+
+class RedisCartStorage:
+    """
+    Cart lines kept in a Redis hash per user (product id -> quantity).
+
+    Products are rendered from cached CartProductSerializer snapshots, and
+    Cart/CartItem are only written by `persist`, which checkout calls before
+    placing the order and the flush_carts task calls for carts changed since
+    the last flush.
+    """
+    key_prefix = 'shop:cart'
+    dirty_key = 'shop:cart:dirty'
+
+    def __init__(self):
+        self.redis = get_redis_connection('default')
+        self.ttl = getattr(settings, 'CART_REDIS_TTL', 60 * 60 * 24 * 30)
+
+    def get_key(self, user_id):
+        return f'{self.key_prefix}:{user_id}'
+
+    def get_lines(self, user_id):
+        return {
+            int(product_id): int(quantity)
+            for product_id, quantity in self.redis.hgetall(self.get_key(user_id)).items()
+        }
+
+    def add(self, user, lines):
+        key = self.get_key(user.pk)
+        pipe = self.redis.pipeline()
+        for product_id, quantity in lines.items():
+            pipe.hincrby(key, product_id, quantity)
+        pipe.expire(key, self.ttl)
+        pipe.sadd(self.dirty_key, user.pk)
+        pipe.execute()
+
+    def remove(self, user, product_id):
+        pipe = self.redis.pipeline()
+        pipe.hdel(self.get_key(user.pk), product_id)
+        pipe.sadd(self.dirty_key, user.pk)
+        removed, _ = pipe.execute()
+        return removed > 0
+
+    def clear(self, user):
+        pipe = self.redis.pipeline()
+        pipe.delete(self.get_key(user.pk))
+        pipe.sadd(self.dirty_key, user.pk)
+        pipe.execute()
+
+    def render(self, user):
+        return render_lines(self.get_lines(user.pk))
+
+    @transaction.atomic
+    def persist(self, user_id):
+        lines = self.get_lines(user_id)
+        existing = set(Product.objects.filter(pk__in=lines).values_list('pk', flat=True))
+        lines = {product_id: quantity for product_id, quantity in lines.items() if product_id in existing}
+
+        cart, created = Cart.objects.get_or_create(user_id=user_id)
+        CartItem.objects.filter(cart=cart).exclude(product_id__in=lines).delete()
+        CartItem.objects.bulk_create(
+            [CartItem(cart=cart, product_id=product_id, quantity=quantity) for product_id, quantity in lines.items()],
+            update_conflicts=True,
+            unique_fields=['cart', 'product'],
+            update_fields=['quantity', 'updated_at']
+        )
+
+    def flush_dirty(self, batch_size=500):
+        flushed = 0
+        failed = []
+        while True:
+            user_ids = self.redis.spop(self.dirty_key, batch_size)
+            if not user_ids:
+                break
+            for user_id in user_ids:
+                try:
+                    self.persist(int(user_id))
+                    flushed += 1
+                except Exception as e:
+                    # One bad cart must not hold back the rest; it stays dirty for the next flush
+                    logger.error(f"Error flushing cart of user {int(user_id)}: {e}")
+                    failed.append(user_id)
+
+        if failed:
+            self.redis.sadd(self.dirty_key, *failed)
+        return flushed
+
+
+class GuestCartStore:
+    """
+    Carts for anonymous visitors, kept in a Redis hash per signed cart token.
+
+    Guest lines hold no stock; they are folded into the user's cart by
+    `merge_guest_cart` when the visitor logs in.
+    """
+    key_prefix = 'shop:guest-cart'
+    salt = 'shop.guest-cart'
+
+    def __init__(self):
+        self.redis = get_redis_connection('default')
+        self.ttl = getattr(settings, 'GUEST_CART_TTL', 60 * 60 * 24 * 7)
+
+    def issue_token(self):
+        return signing.dumps(uuid.uuid4().hex, salt=self.salt)
+
+    def get_cart_id(self, token):
+        if not token:
+            return None
+        try:
+            return signing.loads(token, salt=self.salt, max_age=self.ttl)
+        except signing.BadSignature:
+            return None
+
+    def get_key(self, cart_id):
+        return f'{self.key_prefix}:{cart_id}'
+
+    def get_lines(self, cart_id):
+        return {
+            int(product_id): int(quantity)
+            for product_id, quantity in self.redis.hgetall(self.get_key(cart_id)).items()
+        }
+
+    def add(self, cart_id, lines):
+        key = self.get_key(cart_id)
+        pipe = self.redis.pipeline()
+        for product_id, quantity in lines.items():
+            pipe.hincrby(key, product_id, quantity)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def remove(self, cart_id, product_id):
+        return self.redis.hdel(self.get_key(cart_id), product_id) > 0
+
+    def delete(self, cart_id):
+        self.redis.delete(self.get_key(cart_id))
+
+    def render(self, cart_id):
+        return render_lines(self.get_lines(cart_id))
+
+
+def merge_guest_cart(user, token):
+    """
+    Fold the guest cart behind `token` into the user's cart in one bulk write.
+
+    Called from login, which must not fail because of the cart. A token
+    with a bad signature or past its age is ignored by get_cart_id. Redis
+    and database errors are logged as warnings and anything else with its
+    traceback; either way the guest cart is kept, since it is only deleted
+    once the merge has committed.
+    """
+    if not token:
+        return
+
+    try:
+        store = GuestCartStore()
+        cart_id = store.get_cart_id(token)
+        if cart_id is None:
+            return
+
+        lines = store.get_lines(cart_id)
+        available = set(Product.objects.available().filter(pk__in=lines).values_list('pk', flat=True))
+        lines = {product_id: quantity for product_id, quantity in lines.items() if product_id in available}
+
+        with transaction.atomic():
+            if lines:
+                try:
+                    with transaction.atomic():
+                        services.reserve_stock(user, lines)
+                except services.OutOfStockError:
+                    # Keep the lines without holds; checkout re-checks stock anyway
+                    pass
+                get_cart_storage().add(user, lines)
+            transaction.on_commit(lambda: store.delete(cart_id), robust=True)
+    except (RedisError, DatabaseError) as e:
+        logger.warning(f"Could not merge guest cart for user {user.pk}: {e}")
+    except Exception:
+        logger.exception(f"Error merging guest cart for user {user.pk}")
+
+
+def get_cart_storage():
+    return import_string(getattr(settings, 'CART_STORAGE_BACKEND', 'shop.cart.DatabaseCartStorage'))()
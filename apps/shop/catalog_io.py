@@ -0,0 +1,200 @@
+import csv
+import json
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from .cache import invalidate_catalog
+from .models import Category, Product
+
+# One row per product; category columns create or rename the category on import
+CATALOG_FIELDS = [
+    'sku', 'category', 'category_name_uz', 'category_name_ru',
+    'title_uz', 'title_ru', 'description_uz', 'description_ru',
+    'price', 'stock', 'attributes',
+]
+PRODUCT_UPDATE_FIELDS = [
+    'title', 'title_uz', 'title_ru', 'description', 'description_uz', 'description_ru',
+    'price', 'stock', 'category', 'attributes', 'updated_at',
+]
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(file, format):
+    """Yield (line number, dict) from a CSV or JSONL file object without loading it whole"""
+    if format == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as e:
+            yield line_number, RowError(f"invalid JSON: {e}")
+
+
+def clean_field(model, name, value, column=None):
+    """Run a model field's own conversion and validators (lengths, digits, slug format) on one value"""
+    try:
+        return model._meta.get_field(name).clean(value, None)
+    except ValidationError as e:
+        raise RowError(f"{column or name}: {' '.join(e.messages)}")
+
+
+def parse_row(row):
+    """Validate one input row into (category slug, category names, Product kwargs)"""
+    if isinstance(row, RowError):
+        raise row
+
+    sku = clean_field(Product, 'sku', (row.get('sku') or '').strip())
+    if not sku:
+        raise RowError("sku is required")
+    slug = clean_field(Category, 'slug', (row.get('category') or '').strip(), 'category')
+    # title and description are checked through the original field, which requires a value
+    title_uz = clean_field(Product, 'title', row.get('title_uz') or '', 'title_uz')
+    price = clean_field(Product, 'price', row.get('price'))
+    if price < 0:
+        raise RowError("price: must not be negative")
+
+    attributes = row.get('attributes') or {}
+    if isinstance(attributes, str):
+        try:
+            attributes = json.loads(attributes)
+        except ValueError:
+            raise RowError("attributes must be a JSON object")
+    if not isinstance(attributes, dict):
+        raise RowError("attributes must be a JSON object")
+
+    names = {
+        'name_uz': clean_field(Category, 'name_uz', row.get('category_name_uz') or '', 'category_name_uz'),
+        'name_ru': clean_field(Category, 'name_ru', row.get('category_name_ru') or '', 'category_name_ru'),
+    }
+    description_uz = clean_field(Product, 'description_uz', row.get('description_uz') or '')
+    return slug, names, {
+        'sku': sku,
+        'title': title_uz,
+        'title_uz': title_uz,
+        'title_ru': clean_field(Product, 'title_ru', row.get('title_ru') or ''),
+        'description': description_uz,
+        'description_uz': description_uz,
+        'description_ru': clean_field(Product, 'description_ru', row.get('description_ru') or ''),
+        'price': price,
+        'stock': clean_field(Product, 'stock', row.get('stock') or 0),
+        'attributes': attributes,
+    }
+
+
+class CatalogImporter:
+    """
+    Upsert products (keyed on sku) and their categories (keyed on slug) in
+    batches of bulk_create(update_conflicts=True), then rebuild the facet rows
+    and search vectors of each batch with set-based updates.
+    """
+
+    def __init__(self, batch_size=2000):
+        self.batch_size = batch_size
+        self.category_ids = {}
+        self.imported = 0
+        self.errors = []
+
+    def run(self, rows, on_batch=None):
+        batch = {}
+        for line_number, row in rows:
+            try:
+                slug, names, fields = parse_row(row)
+            except RowError as e:
+                self.errors.append((line_number, str(e)))
+                continue
+
+            # A repeated sku inside one statement would conflict with itself; the last row wins
+            batch[fields['sku']] = (slug, names, fields)
+            if len(batch) >= self.batch_size:
+                self.write(batch)
+                batch = {}
+                if on_batch:
+                    on_batch(self)
+
+        if batch:
+            self.write(batch)
+            if on_batch:
+                on_batch(self)
+        invalidate_catalog()
+
+    def upsert_categories(self, batch):
+        new = {}
+        for slug, names, _ in batch.values():
+            if slug not in self.category_ids and (slug not in new or any(names.values())):
+                new[slug] = names
+        if not new:
+            return
+
+        named = {slug: names for slug, names in new.items() if any(names.values())}
+        Category.objects.bulk_create(
+            [
+                Category(slug=slug, name=names['name_uz'] or names['name_ru'], **names)
+                for slug, names in named.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['slug'],
+            update_fields=['name', 'name_uz', 'name_ru']
+        )
+        # Rows naming only the slug never overwrite an existing category's names
+        Category.objects.bulk_create(
+            [Category(slug=slug, name=slug, name_uz=slug) for slug in new if slug not in named],
+            ignore_conflicts=True
+        )
+        self.category_ids.update(Category.objects.filter(slug__in=new).values_list('slug', 'pk'))
+
+    @transaction.atomic
+    def write(self, batch):
+        self.upsert_categories(batch)
+        products = [
+            Product(category_id=self.category_ids[slug], **fields)
+            for slug, _, fields in batch.values()
+        ]
+        Product.objects.bulk_create(
+            products,
+            update_conflicts=True,
+            unique_fields=['sku'],
+            update_fields=PRODUCT_UPDATE_FIELDS
+        )
+
+        updated = Product.objects.filter(sku__in=batch)
+        updated.rebuild_attribute_values()
+        if connection.vendor == 'postgresql':
+            updated.update_search_vector()
+        self.imported += len(products)
+
+
+def export_rows(queryset=None, chunk_size=2000):
+    """Yield the catalog as CATALOG_FIELDS dicts, streamed from a server-side cursor"""
+    queryset = Product.objects.all() if queryset is None else queryset
+    values = queryset.order_by('pk').values_list(
+        'sku', 'category__slug', 'category__name_uz', 'category__name_ru',
+        'title_uz', 'title_ru', 'description_uz', 'description_ru',
+        'price', 'stock', 'attributes'
+    )
+    for row in values.iterator(chunk_size=chunk_size):
+        item = dict(zip(CATALOG_FIELDS, row))
+        item['sku'] = item['sku'] or ''
+        item['price'] = str(item['price'])
+        yield item
+
+
+def write_rows(rows, file, format):
+    if format == 'csv':
+        writer = csv.DictWriter(file, fieldnames=CATALOG_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({**row, 'attributes': json.dumps(row['attributes'], ensure_ascii=False)})
+            yield
+        return
+
+    for row in rows:
+        file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        yield
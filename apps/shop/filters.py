@@ -1,7 +1,18 @@
 import django_filters
 from django_filters import rest_framework as filters
-from .models import Product
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import DecimalField, F, Func, Q
+from django.db.models.functions import Greatest
+from rest_framework.filters import SearchFilter
+from rest_framework.settings import api_settings
+from .models import Product, ProductAttributeValue
 import json
+import re
+
+ATTRIBUTE_RANGE_LOOKUPS = ('gt', 'gte', 'lt', 'lte')
+# Keys used in `attributes__<key>` lookups must not smuggle in further transforms
+ATTRIBUTE_KEY_RE = re.compile(r'^[A-Za-z0-9]+(_[A-Za-z0-9]+)*$')
 
 class ProductFilter(filters.FilterSet):
     category = filters.NumberFilter(field_name='category__id')
@@ -14,10 +25,82 @@ class ProductFilter(filters.FilterSet):
         fields = ['category', 'min_price', 'max_price', 'attributes']
 
     def filter_attributes(self, queryset, name, value):
+        """
+        Filter on Product.attributes given a JSON object such as
+        {"brand": "Apple", "color": ["black", "white"], "ram": {"gte": 8}}.
+        Plain values match a product whose attribute equals the value or is a
+        list containing it, lists match any of their values and objects apply
+        gt/gte/lt/lte range lookups.
+        """
         try:
             attrs = json.loads(value)
-            for key, val in attrs.items():
-                queryset = queryset.filter(**{f'attributes__{key}': val})
-            return queryset
         except (json.JSONDecodeError, TypeError):
             return queryset
+        if not isinstance(attrs, dict):
+            return queryset
+
+        for key, val in attrs.items():
+            if isinstance(val, list):
+                if val:
+                    any_of = Q()
+                    for item in val:
+                        any_of |= self.attribute_contains(key, item)
+                    queryset = queryset.filter(any_of)
+            elif isinstance(val, dict):
+                if ATTRIBUTE_KEY_RE.match(key):
+                    queryset = queryset.filter(**{
+                        f'attributes__{key}__{lookup}': bound
+                        for lookup, bound in val.items()
+                        if lookup in ATTRIBUTE_RANGE_LOOKUPS
+                    })
+            else:
+                queryset = queryset.filter(self.attribute_contains(key, val))
+        return queryset
+
+    def attribute_contains(self, key, value):
+        """Products whose `key` attribute is `value`, or a list holding `value`"""
+        if connection.vendor == 'postgresql':
+            # Both `@>` tests are served by the jsonb_path_ops GIN index
+            return Q(attributes__contains={key: value}) | Q(attributes__contains={key: [value]})
+        # JSON containment is Postgres-only; go through the facet rows elsewhere
+        encoded = ProductAttributeValue.encode_value(value)
+        if encoded is None:
+            return Q(pk__in=[])
+        return Q(pk__in=ProductAttributeValue.objects.filter(key=key, value=encoded).values('product_id'))
+
+def as_numeric(expression):
+    # float4 scores do not survive a round trip through a JSON cursor; numeric compares exactly
+    return Func(expression, template='(%(expressions)s)::numeric', output_field=DecimalField())
+
+
+class ProductSearchFilter(SearchFilter):
+    """
+    Ranked full-text search over Product.search_vector with a trigram
+    fallback on the translated titles for misspelled terms. Falls back to
+    the plain SearchFilter on databases other than PostgreSQL.
+    """
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        if not search_terms or connection.vendor != 'postgresql':
+            return super().filter_queryset(request, queryset, view)
+
+        text = ' '.join(search_terms)
+        query = (
+            SearchQuery(text, config='simple', search_type='websearch')
+            | SearchQuery(text, config='russian', search_type='websearch')
+        )
+        queryset = queryset.annotate(
+            rank=as_numeric(SearchRank(F('search_vector'), query)),
+            similarity=as_numeric(Greatest(
+                TrigramWordSimilarity(text, 'title_uz'),
+                TrigramWordSimilarity(text, 'title_ru'),
+            )),
+        ).filter(
+            Q(search_vector=query)
+            | Q(title_uz__trigram_word_similar=text)
+            | Q(title_ru__trigram_word_similar=text)
+        )
+
+        if not request.query_params.get(api_settings.ORDERING_PARAM):
+            queryset = queryset.order_by('-rank', '-similarity', '-created_at')
+        return queryset
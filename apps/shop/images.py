@@ -0,0 +1,89 @@
+import io
+import os
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+from .cache import invalidate_catalog
+from .models import ProductImage
+
+# Pillow format name, file extension and save options per derivative format
+DERIVATIVE_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def get_derivative_widths():
+    return sorted(getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', [320, 640, 1280]))
+
+
+def flatten(source):
+    """Drop transparency onto a white background, since JPEG has no alpha channel"""
+    if source.mode in ('RGBA', 'LA', 'P'):
+        source = source.convert('RGBA')
+        background = Image.new('RGB', source.size, 'white')
+        background.paste(source, mask=source.getchannel('A'))
+        return background
+    return source.convert('RGB')
+
+
+def render_derivatives(source, name):
+    """
+    Resize an upright Pillow image to each configured width, capped at the
+    original width, in every derivative format and save the files next to the
+    original.
+    """
+    source = flatten(source)
+    widths = [width for width in get_derivative_widths() if width < source.width]
+    if len(widths) < len(get_derivative_widths()):
+        # Wider sizes are capped at the original width instead of upscaling
+        widths.append(source.width)
+    stem = os.path.splitext(os.path.basename(name))[0]
+    directory = os.path.join(os.path.dirname(name), 'derivatives')
+
+    sizes = []
+    for width in widths:
+        height = round(source.height * width / source.width)
+        resized = source if width == source.width else source.resize((width, height), Image.LANCZOS)
+        for fmt, (pillow_format, extension, options) in DERIVATIVE_FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, pillow_format, **options)
+            path = default_storage.save(
+                os.path.join(directory, f'{stem}-{width}w.{extension}'), ContentFile(buffer.getvalue())
+            )
+            sizes.append({
+                'format': fmt,
+                'width': width,
+                'height': height,
+                'name': path,
+                'url': default_storage.url(path),
+            })
+    return sizes
+
+
+def delete_derivatives(derivatives):
+    for size in (derivatives or {}).get('sizes', []):
+        default_storage.delete(size['name'])
+
+
+def process_image(image_id):
+    """Generate and store the derivatives of one ProductImage; returns False if it no longer exists"""
+    image = ProductImage.objects.filter(pk=image_id).first()
+    if image is None or not image.image:
+        return False
+
+    with image.image.open('rb') as file, Image.open(file) as source:
+        source = ImageOps.exif_transpose(source)
+        width, height = source.size
+        sizes = render_derivatives(source, image.image.name)
+
+    delete_derivatives(image.derivatives)
+    # update() rather than save() so the post_save signal does not re-queue the image
+    ProductImage.objects.filter(pk=image_id).update(
+        width=width,
+        height=height,
+        derivatives={'source': image.image.name, 'sizes': sizes}
+    )
+    invalidate_catalog()
+    return True
@@ -0,0 +1,143 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils.module_loading import import_string
+from django_redis import get_redis_connection
+from .cache import invalidate_catalog
+from .models import Product, ProductLike
+
+
+class DatabaseLikeStorage:
+    """
+    Like toggles written straight to ProductLike. The stored likes_count is
+    kept exact by the ProductLike signals, but cached catalog pages are not
+    invalidated per like and show it up to CATALOG_CACHE_TIMEOUT late.
+    """
+
+    def toggle(self, user, product_id):
+        product = Product.objects.get(pk=product_id)
+        with transaction.atomic():
+            like, created = ProductLike.objects.get_or_create(user=user, product=product)
+            if not created:
+                like.delete()
+
+        product.refresh_from_db(fields=['likes_count'])
+        return created, product.likes_count
+
+    def liked_product_ids(self, user, product_ids):
+        return ProductLike.objects.liked_product_ids(user, product_ids)
+
+    def flush(self):
+        return 0
+
+
+class RedisLikeStorage:
+    """
+    Like toggles applied to Redis first and written to ProductLike in batches.
+
+    Each user's liked product ids live in a Redis set, loaded from the
+    database on first use, so the liking user reads their own toggles
+    immediately. Toggles are coalesced into a pending hash (last toggle per
+    user and product wins) plus a per-product count delta, which `flush`
+    applies with one bulk insert, one delete per user and a recount of the
+    touched products, then a single catalog invalidation.
+    """
+    user_key_prefix = 'shop:likes:user'
+    pending_key = 'shop:likes:pending'
+    delta_key = 'shop:likes:delta'
+    # Marks a loaded set, so users without likes are not reloaded each time
+    loaded_marker = '-'
+
+    def __init__(self):
+        self.redis = get_redis_connection('default')
+        self.ttl = getattr(settings, 'LIKES_REDIS_TTL', 60 * 60 * 24)
+
+    def get_user_key(self, user_id):
+        return f'{self.user_key_prefix}:{user_id}'
+
+    def load_user(self, user_id):
+        key = self.get_user_key(user_id)
+        if self.redis.expire(key, self.ttl):
+            return key
+
+        product_ids = ProductLike.objects.filter(user_id=user_id).values_list('product_id', flat=True)
+        pipe = self.redis.pipeline()
+        pipe.sadd(key, self.loaded_marker, *product_ids)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+        return key
+
+    def toggle(self, user, product_id):
+        likes_count = Product.objects.filter(pk=product_id).values_list('likes_count', flat=True).first()
+        if likes_count is None:
+            raise Product.DoesNotExist
+
+        key = self.load_user(user.pk)
+        liked = not self.redis.srem(key, product_id)
+        pipe = self.redis.pipeline()
+        if liked:
+            pipe.sadd(key, product_id)
+        pipe.hset(self.pending_key, f'{user.pk}:{product_id}', int(liked))
+        pipe.hincrby(self.delta_key, product_id, 1 if liked else -1)
+        pipe.hget(f'{self.delta_key}:flushing', product_id)
+        *_, delta, flushing_delta = pipe.execute()
+
+        return liked, max(likes_count + delta + int(flushing_delta or 0), 0)
+
+    def liked_product_ids(self, user, product_ids):
+        if not user.is_authenticated or not product_ids:
+            return set()
+
+        key = self.load_user(user.pk)
+        pipe = self.redis.pipeline()
+        for product_id in product_ids:
+            pipe.sismember(key, product_id)
+        return {product_id for product_id, liked in zip(product_ids, pipe.execute()) if liked}
+
+    def flush(self):
+        pending_flushing = f'{self.pending_key}:flushing'
+        delta_flushing = f'{self.delta_key}:flushing'
+
+        # A leftover :flushing hash is from a failed flush and is retried first
+        if not self.redis.exists(pending_flushing):
+            if not self.redis.exists(self.pending_key):
+                return 0
+            pipe = self.redis.pipeline()
+            pipe.rename(self.pending_key, pending_flushing)
+            pipe.rename(self.delta_key, delta_flushing)
+            pipe.execute()
+
+        liked, unliked = [], {}
+        for field, value in self.redis.hgetall(pending_flushing).items():
+            user_id, product_id = map(int, field.decode().split(':'))
+            if int(value):
+                liked.append((user_id, product_id))
+            else:
+                unliked.setdefault(user_id, []).append(product_id)
+
+        product_ids = {product_id for _, product_id in liked}
+        product_ids.update(product_id for ids in unliked.values() for product_id in ids)
+        existing = set(Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True))
+        users = set(User.objects.filter(pk__in={user_id for user_id, _ in liked}).values_list('pk', flat=True))
+
+        with transaction.atomic():
+            for user_id, ids in unliked.items():
+                # Raw deletes skip the per-row post_delete counter and cache signals; rebuild_counters
+                # below recounts the touched products and the catalog is invalidated once
+                ProductLike.objects.filter(user_id=user_id, product_id__in=ids)._raw_delete(ProductLike.objects.db)
+            ProductLike.objects.bulk_create(
+                [
+                    ProductLike(user_id=user_id, product_id=product_id)
+                    for user_id, product_id in liked if product_id in existing and user_id in users
+                ],
+                ignore_conflicts=True
+            )
+            Product.objects.filter(pk__in=existing).rebuild_counters()
+            invalidate_catalog()
+
+        self.redis.delete(pending_flushing, delta_flushing)
+        return len(liked) + sum(len(ids) for ids in unliked.values())
+
+
+def get_like_storage():
+    return import_string(getattr(settings, 'LIKE_STORAGE_BACKEND', 'shop.likes.DatabaseLikeStorage'))()
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class BatchCommand(BaseCommand):
+    """
+    Base for backfill/rebuild commands that walk a queryset in primary key
+    order, `--batch-size` ids at a time, and call `process_batch(ids)` in one
+    transaction per batch. `process_batch` returns the number of rows it
+    changed, or None to count the whole batch.
+    """
+    batch_size = 5000
+    # Formatted with the total returned by process_batch
+    success_message = "Processed {count} rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=self.batch_size)
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def process_batch(self, ids):
+        raise NotImplementedError
+
+    def handle(self, *args, **options):
+        self.options = options
+        batch_size = options['batch_size']
+        queryset = self.get_queryset().order_by('pk')
+        last_id = 0
+        count = 0
+
+        while True:
+            ids = list(queryset.filter(pk__gt=last_id).values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+
+            with transaction.atomic():
+                processed = self.process_batch(ids)
+            count += len(ids) if processed is None else processed
+            last_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(self.success_message.format(count=count)))
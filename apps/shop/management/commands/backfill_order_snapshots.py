@@ -0,0 +1,27 @@
+from django.db.models import Q
+from shop.management.batch import BatchCommand
+from shop.models import OrderItem
+
+
+class Command(BatchCommand):
+    help = "Fill the product snapshot on OrderItem rows created before checkout stored it"
+    batch_size = 2000
+    success_message = "Backfilled snapshots for {count} order items"
+
+    def get_queryset(self):
+        return (
+            OrderItem.objects.filter(product__isnull=False)
+            .filter(Q(product_title_uz__isnull=True) | Q(product_title_uz=''))
+        )
+
+    def process_batch(self, ids):
+        items = list(OrderItem.objects.filter(pk__in=ids).select_related('product__primary_image'))
+        for item in items:
+            item.product_title_uz = item.product.title_uz
+            item.product_title_ru = item.product.title_ru
+            item.product_title = item.product.title
+            item.product_thumbnail = item.product.thumbnail or ''
+
+        OrderItem.objects.bulk_update(
+            items, ['product_title', 'product_title_uz', 'product_title_ru', 'product_thumbnail']
+        )
@@ -0,0 +1,31 @@
+from django.conf import settings
+from shop.cache import invalidate_catalog
+from shop.management.batch import BatchCommand
+from shop.models import Product
+
+
+class Command(BatchCommand):
+    help = "Map the old in_stock flag onto Product.stock for products that predate stock quantities"
+    success_message = "Stocked {count} products"
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--quantity', type=int, default=getattr(settings, 'STOCK_BACKFILL_QUANTITY', 100),
+            help="Stock given to products flagged in stock"
+        )
+
+    def get_queryset(self):
+        return Product.objects.filter(legacy_in_stock__isnull=False)
+
+    def process_batch(self, ids):
+        # Only products nobody has stocked yet; clearing the flag makes reruns a no-op
+        stocked = Product.objects.filter(pk__in=ids, legacy_in_stock=True, stock=0).update(
+            stock=self.options['quantity']
+        )
+        Product.objects.filter(pk__in=ids).update(legacy_in_stock=None)
+        return stocked
+
+    def handle(self, *args, **options):
+        super().handle(*args, **options)
+        invalidate_catalog()
@@ -0,0 +1,13 @@
+from shop.management.batch import BatchCommand
+from shop.models import Order, VerifiedPurchase
+
+
+class Command(BatchCommand):
+    help = "Create VerifiedPurchase rows for existing orders with a reviewable status"
+    success_message = "Backfilled verified purchases from {count} orders"
+
+    def get_queryset(self):
+        return Order.objects.filter(status__in=Order.REVIEWABLE_STATUSES)
+
+    def process_batch(self, ids):
+        VerifiedPurchase.objects.grant_for_orders(ids)
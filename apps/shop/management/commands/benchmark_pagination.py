@@ -0,0 +1,76 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from shop.models import Category, Product
+
+PAGE_SIZE = 20
+
+
+class Command(BaseCommand):
+    help = "Compare OFFSET and keyset page latency at increasing depths of the product list"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200_000)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--runs', type=int, default=20)
+        parser.add_argument('--depths', type=int, nargs='*', default=[1, 100, 1_000, 5_000])
+        parser.add_argument('--skip-seed', action='store_true')
+        parser.add_argument('--cleanup', action='store_true', help="Delete the synthetic products afterwards")
+
+    def handle(self, *args, **options):
+        category, _ = Category.objects.get_or_create(slug='benchmark', defaults={'name': 'Benchmark'})
+        if not options['skip_seed']:
+            self.seed(category, options['products'], options['batch_size'])
+
+        queryset = Product.objects.filter(category=category).order_by('-created_at', '-pk')
+        for depth in options['depths']:
+            offset = (depth - 1) * PAGE_SIZE
+            last = list(queryset.values_list('created_at', 'pk')[offset - 1:offset]) if offset else []
+            if offset and not last:
+                self.stdout.write(f"page {depth}: beyond the seeded products")
+                continue
+
+            offset_page = queryset[offset:offset + PAGE_SIZE]
+            keyset_page = queryset
+            if last:
+                created_at, pk = last[0]
+                # The condition KeysetPagination.get_keyset_filter builds for this ordering
+                keyset_page = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+                )
+            keyset_page = keyset_page[:PAGE_SIZE]
+
+            for label, page in (('OFFSET', offset_page), ('keyset', keyset_page)):
+                timings = []
+                for _ in range(options['runs']):
+                    started = time.perf_counter()
+                    list(page.values_list('pk', flat=True))
+                    timings.append((time.perf_counter() - started) * 1000)
+
+                self.stdout.write(
+                    f"page {depth:<8} {label:<7} "
+                    f"p50={statistics.median(timings):.1f}ms max={max(timings):.1f}ms"
+                )
+
+        if options['cleanup']:
+            Product.objects.filter(category=category).delete()
+            category.delete()
+
+    def seed(self, category, total, batch_size):
+        created = 0
+        while created < total:
+            size = min(batch_size, total - created)
+            Product.objects.bulk_create([
+                Product(
+                    title=f"Product {created + i}",
+                    title_uz=f"Product {created + i}",
+                    description='',
+                    price=(created + i) % 1000,
+                    stock=1,
+                    category=category,
+                )
+                for i in range(size)
+            ])
+            created += size
+            self.stdout.write(f"Seeded {created}/{total} products")
@@ -0,0 +1,81 @@
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from shop.filters import ProductSearchFilter
+from shop.models import Category, Product
+from shop.views import ProductListView
+
+WORDS_UZ = ['telefon', 'noutbuk', 'quloqchin', 'soat', 'kamera', 'planshet', 'televizor', 'kitob', 'sumka', 'krossovka']
+WORDS_RU = ['телефон', 'ноутбук', 'наушники', 'часы', 'камера', 'планшет', 'телевизор', 'книга', 'сумка', 'кроссовки']
+BRANDS = ['Samsung', 'Apple', 'Xiaomi', 'Huawei', 'Lenovo', 'Sony', 'Artel', 'LG', 'Nike', 'Adidas']
+
+
+class Command(BaseCommand):
+    help = "Compare latency of the ILIKE SearchFilter and the full-text ProductSearchFilter on synthetic products"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1_000_000)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--runs', type=int, default=20)
+        parser.add_argument('--skip-seed', action='store_true')
+        parser.add_argument('--cleanup', action='store_true', help="Delete the synthetic products afterwards")
+        parser.add_argument('terms', nargs='*', default=['samsung telefon', 'ноутбук', 'telefn'])
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("The search benchmark requires PostgreSQL")
+
+        category, _ = Category.objects.get_or_create(slug='benchmark', defaults={'name': 'Benchmark'})
+        if not options['skip_seed']:
+            self.seed(category, options['products'], options['batch_size'])
+
+        view = ProductListView()
+        view.search_fields = ['title', 'description']
+        queryset = Product.objects.filter(category=category)
+        factory = APIRequestFactory()
+
+        for term in options['terms']:
+            request = Request(factory.get('/products/', {'search': term}))
+            for backend in (SearchFilter(), ProductSearchFilter()):
+                timings = []
+                for _ in range(options['runs']):
+                    started = time.perf_counter()
+                    list(backend.filter_queryset(request, queryset, view)[:20])
+                    timings.append((time.perf_counter() - started) * 1000)
+
+                self.stdout.write(
+                    f"{backend.__class__.__name__:<20} {term!r:<20} "
+                    f"p50={statistics.median(timings):.1f}ms max={max(timings):.1f}ms"
+                )
+
+        if options['cleanup']:
+            Product.objects.filter(category=category).delete()
+            category.delete()
+
+    def seed(self, category, total, batch_size):
+        created = 0
+        while created < total:
+            size = min(batch_size, total - created)
+            products = []
+            for _ in range(size):
+                word = random.randrange(len(WORDS_UZ))
+                brand = random.choice(BRANDS)
+                products.append(Product(
+                    title=f"{brand} {WORDS_UZ[word]}",
+                    title_uz=f"{brand} {WORDS_UZ[word]}",
+                    title_ru=f"{brand} {WORDS_RU[word]}",
+                    description=f"{WORDS_UZ[word]} {random.randint(1, 10_000)}",
+                    description_uz=f"{WORDS_UZ[word]} {random.randint(1, 10_000)}",
+                    description_ru=f"{WORDS_RU[word]} {random.randint(1, 10_000)}",
+                    price=random.randint(10, 10_000),
+                    category=category,
+                ))
+            batch = Product.objects.bulk_create(products)
+            Product.objects.filter(pk__in=[product.pk for product in batch]).update_search_vector()
+            created += size
+            self.stdout.write(f"Seeded {created}/{total} products")
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from shop.catalog_io import export_rows, write_rows
+
+
+class Command(BaseCommand):
+    help = "Stream the catalog to a CSV or JSONL file in the import_catalog format"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default='jsonl')
+        parser.add_argument('--output', default='-', help="Output file (default: stdout)")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        rows = export_rows(chunk_size=options['chunk_size'])
+        if options['output'] == '-':
+            exported = sum(1 for _ in write_rows(rows, self.stdout, options['format']))
+            # stdout carries the dump, so the summary goes to stderr
+            self.stderr.write(self.style.SUCCESS(f"Exported {exported} products"))
+            return
+
+        with open(options['output'], 'w', newline='', encoding='utf-8') as file:
+            exported = sum(1 for _ in write_rows(rows, file, options['format']))
+        self.stdout.write(self.style.SUCCESS(f"Exported {exported} products to {options['output']}"))
@@ -0,0 +1,45 @@
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from shop.images import process_image
+from shop.models import ProductImage
+
+
+def process(image_id):
+    """process_image for the pool, reporting a failure (missing or corrupt file, ...) instead of raising it"""
+    try:
+        return image_id, process_image(image_id), None
+    except Exception as e:
+        return image_id, False, f"{type(e).__name__}: {e}"
+
+
+class Command(BaseCommand):
+    help = "Generate the resized WebP/JPEG copies for existing product images in a process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--force', action='store_true', help="Regenerate images that already have derivatives")
+
+    def handle(self, *args, **options):
+        queryset = ProductImage.objects.order_by('pk')
+        if not options['force']:
+            queryset = queryset.filter(derivatives={})
+        ids = list(queryset.values_list('pk', flat=True))
+
+        # Children open their own connections; inherited sockets must not be shared
+        connections.close_all()
+        processed = 0
+        failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as executor:
+            for start in range(0, len(ids), options['batch_size']):
+                batch = ids[start:start + options['batch_size']]
+                for image_id, done, error in executor.map(process, batch, chunksize=16):
+                    processed += done
+                    if error:
+                        failed += 1
+                        self.stderr.write(f"Image {image_id}: {error}")
+                self.stdout.write(f"Processed {start + len(batch)}/{len(ids)} images")
+
+        self.stdout.write(self.style.SUCCESS(f"Generated derivatives for {processed} images, {failed} failed"))
@@ -0,0 +1,37 @@
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from shop.catalog_io import CatalogImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = "Upsert categories and products (keyed on sku) from a CSV or JSONL catalog file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Catalog file, or - for stdin")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default=None, help="Default: from the file extension")
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        importer = CatalogImporter(batch_size=options['batch_size'])
+        started = time.monotonic()
+
+        def report(importer):
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"Imported {importer.imported} products ({importer.imported / elapsed:.0f}/s)")
+
+        try:
+            file = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(e)
+        with file:
+            importer.run(read_rows(file, format), on_batch=report)
+
+        for line_number, error in importer.errors:
+            self.stderr.write(f"line {line_number}: {error}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {importer.imported} products in {time.monotonic() - started:.1f}s, "
+            f"{len(importer.errors)} rows rejected"
+        ))
@@ -0,0 +1,13 @@
+from shop.management.batch import BatchCommand
+from shop.models import Product
+
+
+class Command(BatchCommand):
+    help = "Rebuild the ProductAttributeValue facet rows from Product.attributes"
+    success_message = "Rebuilt attribute values for {count} products"
+
+    def get_queryset(self):
+        return Product.objects.all()
+
+    def process_batch(self, ids):
+        Product.objects.filter(pk__in=ids).rebuild_attribute_values()
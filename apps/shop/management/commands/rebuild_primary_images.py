@@ -0,0 +1,13 @@
+from shop.management.batch import BatchCommand
+from shop.models import Product
+
+
+class Command(BatchCommand):
+    help = "Repoint Product.primary_image from ProductImage.is_primary (or the oldest image)"
+    success_message = "Refreshed primary images for {count} products"
+
+    def get_queryset(self):
+        return Product.objects.all()
+
+    def process_batch(self, ids):
+        return Product.objects.filter(pk__in=ids).refresh_primary_images()
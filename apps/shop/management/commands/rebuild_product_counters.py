@@ -0,0 +1,13 @@
+from shop.management.batch import BatchCommand
+from shop.models import Product
+
+
+class Command(BatchCommand):
+    help = "Rebuild stored rating/review/like counters on Product from Review and ProductLike"
+    success_message = "Rebuilt counters for {count} products"
+
+    def get_queryset(self):
+        return Product.objects.all()
+
+    def process_batch(self, ids):
+        return Product.objects.filter(pk__in=ids).rebuild_counters()
@@ -1,7 +1,15 @@
-from django.db import models
+from django.db import IntegrityError, connections, models, transaction
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db.models import Exists, F, Max, OuterRef, Q, Subquery, Sum, Count, Value
+from django.db.models.functions import Coalesce, Greatest
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
-import uuid
+from django.utils import timezone
+import datetime
+import json
+
+RATING_VALUES = range(1, 6)
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -16,60 +24,332 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+def increment_upsert(queryset, rows, conflict_fields, increment_field):
+    """
+    Insert `rows` (dicts of field name -> value) in one statement, adding
+    `increment_field` onto existing rows that clash on `conflict_fields`:
+
+        INSERT ... ON CONFLICT (...) DO UPDATE SET f = table.f + EXCLUDED.f, ...
+
+    Every other inserted field is overwritten with the new value.
+    """
+    if not rows:
+        return
+    model = queryset.model
+    connection = connections[queryset.db]
+    quote = connection.ops.quote_name
+    field_names = list(rows[0])
+    fields = [model._meta.get_field(name) for name in field_names]
+    table = quote(model._meta.db_table)
+    columns = [quote(field.column) for field in fields]
+    conflict = [quote(model._meta.get_field(name).column) for name in conflict_fields]
+
+    updates = []
+    for field, column in zip(fields, columns):
+        if field.name == increment_field:
+            updates.append(f'{column} = {table}.{column} + EXCLUDED.{column}')
+        elif field.name not in conflict_fields and field.name != 'created_at':
+            updates.append(f'{column} = EXCLUDED.{column}')
+
+    placeholders = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    params = [
+        field.get_db_prep_save(row[field.name], connection)
+        for row in rows
+        for field in fields
+    ]
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([placeholders] * len(rows))} "
+        f"ON CONFLICT ({', '.join(conflict)}) DO UPDATE SET {', '.join(updates)}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+class ProductQuerySet(models.QuerySet):
+    def available(self):
+        return self.filter(stock__gt=0)
+
+    def with_primary_image(self):
+        return self.select_related('primary_image')
+
+    def for_listing(self):
+        return self.select_related('category').with_primary_image()
+
+    def refresh_primary_images(self):
+        """Point primary_image at the flagged image, or the oldest one when none is flagged"""
+        images = ProductImage.objects.filter(product=OuterRef('pk')).order_by('-is_primary', 'created_at', 'pk')
+        return self.update(primary_image=Subquery(images.values('pk')[:1]))
+
+    def update_search_vector(self):
+        """Refresh the stored full-text vector from the uz/ru translations"""
+        return self.update(search_vector=(
+            SearchVector('title_uz', weight='A', config='simple')
+            + SearchVector('title_ru', weight='A', config='russian')
+            + SearchVector('description_uz', weight='B', config='simple')
+            + SearchVector('description_ru', weight='B', config='russian')
+        ))
+
+    def rebuild_attribute_values(self):
+        """Rewrite the ProductAttributeValue facet rows for these products"""
+        products = list(self.order_by().values_list('pk', 'attributes'))
+        ProductAttributeValue.objects.filter(product_id__in=[pk for pk, _ in products]).delete()
+        ProductAttributeValue.objects.bulk_create([
+            ProductAttributeValue(product_id=pk, key=key, value=value)
+            for pk, attributes in products
+            for key, value in ProductAttributeValue.flatten(attributes)
+        ], batch_size=1000)
+
+    def attribute_value_counts(self, limit=None):
+        rows = (
+            ProductAttributeValue.objects
+            .filter(product__in=self.order_by().values('pk'))
+            .values('key', 'value')
+            .annotate(count=Count('product_id', distinct=True))
+            .order_by('key', '-count', 'value')
+        )
+        counts = {}
+        for row in rows:
+            values = counts.setdefault(row['key'], [])
+            if limit is None or len(values) < limit:
+                values.append({'value': ProductAttributeValue.decode_value(row['value']), 'count': row['count']})
+        return counts
+
+    def category_counts(self):
+        return list(
+            self.order_by()
+            .values('category_id', 'category__name', 'category__slug')
+            .annotate(count=Count('pk'))
+            .order_by('-count', 'category__name')
+        )
+
+    def price_bucket_counts(self, bounds):
+        """Count products per [bounds[i], bounds[i + 1]) price band in one aggregate query"""
+        bands = list(zip(bounds, list(bounds[1:]) + [None]))
+        aggregates = {}
+        for index, (low, high) in enumerate(bands):
+            condition = Q(price__gte=low)
+            if high is not None:
+                condition &= Q(price__lt=high)
+            aggregates[f'band_{index}'] = Count('pk', filter=condition)
+        counts = self.order_by().aggregate(**aggregates)
+        return [
+            {'min': low, 'max': high, 'count': counts[f'band_{index}']}
+            for index, (low, high) in enumerate(bands)
+        ]
+
+    def rebuild_counters(self):
+        """Recompute the stored review/like counters from Review and ProductLike"""
+        reviews = Review.objects.filter(product=OuterRef('pk')).order_by().values('product')
+        likes = ProductLike.objects.filter(product=OuterRef('pk')).order_by().values('product')
+        histogram = {
+            f'rating_{rating}_count': Coalesce(
+                Subquery(reviews.filter(rating=rating).annotate(c=Count('pk')).values('c')), Value(0)
+            )
+            for rating in RATING_VALUES
+        }
+        return self.update(
+            rating_sum=Coalesce(Subquery(reviews.annotate(s=Sum('rating')).values('s')), Value(0)),
+            reviews_count=Coalesce(Subquery(reviews.annotate(c=Count('pk')).values('c')), Value(0)),
+            likes_count=Coalesce(Subquery(likes.annotate(c=Count('pk')).values('c')), Value(0)),
+            **histogram
+        )
+
+    def add_review(self, product_id, rating):
+        return self.filter(pk=product_id).update(
+            rating_sum=F('rating_sum') + rating,
+            reviews_count=F('reviews_count') + 1,
+            **{f'rating_{rating}_count': F(f'rating_{rating}_count') + 1}
+        )
+
+    def remove_review(self, product_id, rating):
+        return self.filter(pk=product_id, reviews_count__gt=0).update(
+            rating_sum=F('rating_sum') - rating,
+            reviews_count=F('reviews_count') - 1,
+            **{f'rating_{rating}_count': Greatest(F(f'rating_{rating}_count') - 1, 0)}
+        )
+
+    def add_likes(self, product_id, delta):
+        queryset = self.filter(pk=product_id)
+        if delta < 0:
+            queryset = queryset.filter(likes_count__gte=-delta)
+        return queryset.update(likes_count=F('likes_count') + delta)
+
+
 class Product(models.Model):
+    # External (ERP) identifier; the key import_catalog upserts on
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     title = models.CharField(max_length=200)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     attributes = models.JSONField(default=dict, blank=True)
-    in_stock = models.BooleanField(default=True)
+    stock = models.PositiveIntegerField(default=0)
+    # The in_stock flag stock replaced, kept on its column until backfill_stock maps it onto quantities
+    legacy_in_stock = models.BooleanField(null=True, editable=False, db_column='in_stock')
+    # Units held by unexpired StockReservation rows, maintained with conditional UPDATEs
+    reserved = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    reviews_count = models.PositiveIntegerField(default=0, editable=False)
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
+    # Denormalized from ProductImage by signals (refresh_primary_images) so listings join it directly
+    primary_image = models.ForeignKey(
+        'ProductImage', null=True, blank=True, editable=False, related_name='+', on_delete=models.SET_NULL
+    )
+    # Review counts per star, kept alongside rating_sum/reviews_count
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            GinIndex(fields=['attributes'], opclasses=['jsonb_path_ops'], name='product_attributes_path_idx'),
+            # Keyset pagination keys
+            models.Index(fields=['created_at', 'id'], name='product_created_id_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            GinIndex(fields=['search_vector'], name='product_search_vector_idx'),
+            # Trigram indexes need the pg_trgm extension (TrigramExtension migration)
+            GinIndex(fields=['title_uz'], opclasses=['gin_trgm_ops'], name='product_title_uz_trgm_idx'),
+            GinIndex(fields=['title_ru'], opclasses=['gin_trgm_ops'], name='product_title_ru_trgm_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @property
+    def in_stock(self):
+        return self.stock > 0
+
+    @property
+    def available_stock(self):
+        return max(self.stock - self.reserved, 0)
+
     @property
     def thumbnail(self):
-        image = self.images.first()
-        return image.image.url if image else None
+        return self.primary_image.thumbnail_url if self.primary_image_id else None
+
+    @property
+    def thumbnail_srcset(self):
+        return self.primary_image.srcset if self.primary_image_id else {}
 
     @property
     def images_list(self):
         return [img.image.url for img in self.images.all()]
 
+    @property
+    def image_sources(self):
+        return [img.sources for img in self.images.all()]
+
     @property
     def average_rating(self):
-        reviews = self.reviews.all()
-        if reviews:
-            return sum(review.rating for review in reviews) / len(reviews)
+        if self.reviews_count:
+            return self.rating_sum / self.reviews_count
         return 0
 
     @property
-    def reviews_count(self):
-        return self.reviews.count()
+    def rating_histogram(self):
+        return {rating: getattr(self, f'rating_{rating}_count') for rating in RATING_VALUES}
 
-    @property
-    def likes_count(self):
-        return self.likes.count()
+class ProductAttributeValue(models.Model):
+    """One row per (product, attribute key, JSON-encoded scalar value), used for facet counts"""
+    product = models.ForeignKey(Product, related_name='attribute_values', on_delete=models.CASCADE)
+    key = models.CharField(max_length=100)
+    value = models.CharField(max_length=255)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['key', 'value', 'product'], name='attr_value_key_value_idx'),
+        ]
+
+    @staticmethod
+    def encode_value(item):
+        """
+        The stored form of one scalar attribute value: its JSON text, so 8 and
+        "8" stay distinct and facet counts can hand back the original type.
+        None for values that get no row, including ones too long to store whole.
+        """
+        if isinstance(item, (dict, list)) or item is None:
+            return None
+        encoded = json.dumps(item, ensure_ascii=False)
+        return encoded if len(encoded) <= 255 else None
+
+    @staticmethod
+    def decode_value(value):
+        try:
+            return json.loads(value)
+        except ValueError:
+            # Rows written before values were JSON-encoded, until rebuild_attribute_values runs
+            return value
+
+    @classmethod
+    def flatten(cls, attributes):
+        if not isinstance(attributes, dict):
+            return
+        for key, value in attributes.items():
+            for item in value if isinstance(value, list) else [value]:
+                encoded = cls.encode_value(item)
+                if encoded is not None:
+                    yield key[:100], encoded
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, related_name='images', on_delete=models.CASCADE)
     image = models.ImageField(upload_to='products/')
     is_primary = models.BooleanField(default=False)
+    width = models.PositiveIntegerField(null=True, editable=False)
+    height = models.PositiveIntegerField(null=True, editable=False)
+    # {'source': image name, 'sizes': [{'format', 'width', 'height', 'name', 'url'}]}, filled by shop.images
+    derivatives = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-is_primary', 'created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product'], condition=Q(is_primary=True), name='productimage_single_primary'
+            ),
+        ]
+
+    @property
+    def srcset(self):
+        """{format: 'url 320w, url 640w'} for the resized copies, empty until they are generated"""
+        srcset = {}
+        for size in self.derivatives.get('sizes', []):
+            srcset.setdefault(size['format'], []).append(f"{size['url']} {size['width']}w")
+        return {fmt: ', '.join(candidates) for fmt, candidates in srcset.items()}
+
+    @property
+    def thumbnail_url(self):
+        jpegs = [size for size in self.derivatives.get('sizes', []) if size['format'] == 'jpeg']
+        if jpegs:
+            return min(jpegs, key=lambda size: size['width'])['url']
+        return self.image.url
+
+    @property
+    def sources(self):
+        return {'url': self.image.url, 'width': self.width, 'height': self.height, 'srcset': self.srcset}
+
+class ProductLikeQuerySet(models.QuerySet):
+    def liked_product_ids(self, user, product_ids):
+        """The subset of `product_ids` the user has liked, fetched with one IN query"""
+        if not user.is_authenticated or not product_ids:
+            return set()
+        return set(self.filter(user=user, product_id__in=product_ids).values_list('product_id', flat=True))
+
 
 class ProductLike(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, related_name='likes', on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ProductLikeQuerySet.as_manager()
+
     class Meta:
         unique_together = ('user', 'product')
 
@@ -86,6 +366,20 @@ class Cart(models.Model):
     def items_count(self):
         return sum(item.quantity for item in self.items.all())
 
+class CartItemQuerySet(models.QuerySet):
+    def with_products(self):
+        """Load each line's product, category and primary image in one query"""
+        return self.select_related('product__category', 'product__primary_image')
+
+    def add_quantities(self, cart_id, lines):
+        """Add {product_id: quantity} to the cart lines with a single upsert"""
+        now = timezone.now()
+        increment_upsert(self, [
+            {'cart': cart_id, 'product': product_id, 'quantity': quantity, 'created_at': now, 'updated_at': now}
+            for product_id, quantity in lines.items()
+        ], conflict_fields=['cart', 'product'], increment_field='quantity')
+
+
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -93,6 +387,8 @@ class CartItem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartItemQuerySet.as_manager()
+
     class Meta:
         unique_together = ('cart', 'product')
 
@@ -100,6 +396,93 @@ class CartItem(models.Model):
     def subtotal(self):
         return self.product.price * self.quantity
 
+class StockReservationQuerySet(models.QuerySet):
+    def hold(self, user_id, lines, expires_at):
+        """Add {product_id: quantity} to the user's reservations and extend their expiry"""
+        now = timezone.now()
+        increment_upsert(self, [
+            {'user': user_id, 'product': product_id, 'quantity': quantity, 'expires_at': expires_at, 'created_at': now}
+            for product_id, quantity in lines.items()
+        ], conflict_fields=['user', 'product'], increment_field='quantity')
+
+
+class StockReservation(models.Model):
+    """Stock held for a cart line until it is checked out or expires"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stock_reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = StockReservationQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('user', 'product')
+        indexes = [
+            models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+        ]
+
+# Zero-padded so order numbers sort in issue order within a day
+ORDER_NUMBER_DIGITS = 7
+# Created by signals.create_order_number_sequence after migrate, on PostgreSQL only
+ORDER_NUMBER_SEQUENCE = 'shop_order_number_seq'
+# Inserts retried with a fresh number when the allocated one is already taken
+ORDER_NUMBER_ATTEMPTS = 3
+
+
+class OrderQuerySet(models.QuerySet):
+    def with_items_total(self):
+        """Annotate items_total as the summed item quantities, computed per returned row"""
+        items_total = (
+            OrderItem.objects.filter(order=OuterRef('pk'))
+            .values('order')
+            .annotate(total=Sum('quantity'))
+            .values('total')
+        )
+        return self.annotate(items_total=Coalesce(Subquery(items_total), 0))
+
+    def created_between(self, date_from=None, date_to=None):
+        """Orders created on local dates date_from..date_to (inclusive), as a range on created_at"""
+        # Bounds are compared against created_at itself, never created_at__date, so the index applies
+        def start_of(day):
+            return datetime.datetime.combine(day, datetime.time.min, tzinfo=timezone.get_current_timezone())
+
+        queryset = self
+        if date_from:
+            queryset = queryset.filter(created_at__gte=start_of(date_from))
+        if date_to:
+            queryset = queryset.filter(created_at__lt=start_of(date_to + datetime.timedelta(days=1)))
+        return queryset
+
+    def allocate_numbers(self, count=1):
+        """
+        Reserve `count` order numbers for today, e.g. ORD-20260101-0000042.
+
+        On PostgreSQL the sequence part comes from ORDER_NUMBER_SEQUENCE, one
+        nextval per number in a single generate_series query, so numbers are
+        unique across concurrent transactions and never reused after a
+        rollback. The sequence does not restart daily; the date prefix only
+        groups numbers. Elsewhere they continue from the highest number stored
+        for the day, and Order.save retries if a concurrent insert took one.
+        """
+        prefix = f"ORD-{timezone.localdate().strftime('%Y%m%d')}-"
+        connection = connections[self.db]
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT nextval(%s) FROM generate_series(1, %s)', [ORDER_NUMBER_SEQUENCE, count])
+                sequences = [row[0] for row in cursor.fetchall()]
+        else:
+            last_number = (
+                self.model.objects.using(self.db)
+                .filter(order_number__regex=rf'^{prefix}[0-9]{{{ORDER_NUMBER_DIGITS}}}$')
+                .aggregate(last=Max('order_number'))['last']
+            )
+            last = int(last_number[len(prefix):]) if last_number else 0
+            sequences = range(last + 1, last + count + 1)
+
+        return [f'{prefix}{sequence:0{ORDER_NUMBER_DIGITS}d}' for sequence in sequences]
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -108,6 +491,16 @@ class Order(models.Model):
         ('delivered', 'Delivered'),
         ('cancelled', 'Cancelled'),
     ]
+    # Allowed status changes; delivered and cancelled are final
+    TRANSITIONS = {
+        'pending': {'processing', 'cancelled'},
+        'processing': {'shipped', 'cancelled'},
+        'shipped': {'delivered'},
+        'delivered': set(),
+        'cancelled': set(),
+    }
+    # Buying a product in an order with one of these statuses allows reviewing it
+    REVIEWABLE_STATUSES = ('processing', 'shipped', 'delivered')
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     order_number = models.CharField(max_length=50, unique=True)
@@ -121,15 +514,39 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OrderQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_id_idx'),
+            models.Index(fields=['user', 'status', 'created_at', 'id'], name='order_user_status_created_idx'),
+            # Staff exports filter on a created_at range, optionally per status
+            models.Index(fields=['created_at', 'id'], name='order_created_id_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='order_status_created_idx'),
+        ]
 
     def save(self, *args, **kwargs):
-        if not self.order_number:
-            self.order_number = f"ORD-{self.created_at.strftime('%Y%m%d')}-{uuid.uuid4().hex[:8].upper()}"
-        if not self.tracking_number and self.status == 'shipped':
-            self.tracking_number = f"1Z999AA{uuid.uuid4().hex[:10].upper()}"
-        super().save(*args, **kwargs)
+        if self.order_number:
+            return super().save(*args, **kwargs)
+
+        for attempt in range(1, ORDER_NUMBER_ATTEMPTS + 1):
+            self.order_number = Order.objects.allocate_numbers()[0]
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                taken = Order.objects.filter(order_number=self.order_number).exists()
+                if not taken or attempt == ORDER_NUMBER_ATTEMPTS:
+                    self.order_number = ''
+                    raise
+
+    @classmethod
+    def source_statuses(cls, to_status):
+        return [status for status, targets in cls.TRANSITIONS.items() if to_status in targets]
+
+    def can_transition(self, to_status):
+        return to_status in self.TRANSITIONS[self.status]
 
     @property
     def items_count(self):
@@ -137,7 +554,10 @@ class Order(models.Model):
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
-    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, null=True, on_delete=models.SET_NULL)
+    # Snapshot taken at checkout, so old orders render without touching products
+    product_title = models.CharField(max_length=255)
+    product_thumbnail = models.CharField(max_length=500, blank=True)
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2)
@@ -146,6 +566,64 @@ class OrderItem(models.Model):
         self.subtotal = self.price * self.quantity
         super().save(*args, **kwargs)
 
+class OrderStatusHistory(models.Model):
+    """Append-only audit trail of order status changes"""
+    order = models.ForeignKey(Order, related_name='status_history', on_delete=models.CASCADE)
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, blank=True)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    tracking_number = models.CharField(max_length=100, blank=True)
+    changed_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['order', 'created_at'], name='order_status_history_idx'),
+        ]
+
+class VerifiedPurchaseQuerySet(models.QuerySet):
+    def grant_for_orders(self, order_ids):
+        """Record every (user, product) bought in the given orders"""
+        if not order_ids:
+            return
+        pairs = (
+            OrderItem.objects.filter(order_id__in=order_ids, product__isnull=False)
+            .values_list('order__user_id', 'product_id')
+            .distinct()
+        )
+        self.bulk_create(
+            [VerifiedPurchase(user_id=user_id, product_id=product_id) for user_id, product_id in pairs],
+            ignore_conflicts=True
+        )
+
+    def revoke_for_orders(self, order_ids):
+        """Drop purchases from the given orders that no other reviewable order still backs"""
+        if not order_ids:
+            return 0
+        in_orders = OrderItem.objects.filter(
+            order_id__in=order_ids,
+            order__user_id=OuterRef('user_id'),
+            product_id=OuterRef('product_id')
+        )
+        elsewhere = OrderItem.objects.filter(
+            order__user_id=OuterRef('user_id'),
+            product_id=OuterRef('product_id'),
+            order__status__in=Order.REVIEWABLE_STATUSES
+        ).exclude(order_id__in=order_ids)
+        return self.filter(Exists(in_orders)).exclude(Exists(elsewhere)).delete()[0]
+
+
+class VerifiedPurchase(models.Model):
+    """A user bought a product in an order with a reviewable status; checked before accepting a review"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = VerifiedPurchaseQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('user', 'product')
+
 class Review(models.Model):
     product = models.ForeignKey(Product, related_name='reviews', on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -156,6 +634,9 @@ class Review(models.Model):
     class Meta:
         unique_together = ('product', 'user')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['product', 'created_at', 'id'], name='review_product_created_id_idx'),
+        ]
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
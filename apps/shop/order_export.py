@@ -0,0 +1,81 @@
+import csv
+import io
+import json
+from itertools import groupby
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from .models import OrderItem
+
+ORDER_FIELDS = [
+    'order_number', 'created_at', 'status', 'user_id', 'username',
+    'subtotal', 'shipping_fee', 'total', 'tracking_number',
+]
+ORDER_LOOKUPS = ['order__user__username' if field == 'username' else f'order__{field}' for field in ORDER_FIELDS]
+ITEM_FIELDS = ['product_id', 'product_title', 'quantity', 'price', 'subtotal']
+# CSV has one line per order item; the item subtotal is renamed to keep columns unique
+CSV_FIELDS = ORDER_FIELDS + ['product_id', 'product_title', 'quantity', 'price', 'line_subtotal']
+CONTENT_TYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+# Response chunk size; rows are buffered up to this many characters before being sent
+FLUSH_SIZE = 64 * 1024
+
+
+def export_orders(queryset, chunk_size=2000):
+    """
+    Yield each order of `queryset` as a dict with its items, in created_at order.
+
+    Orders and items are read as one joined values_list from a server-side
+    cursor, so memory stays flat however many orders match; consecutive rows
+    of the same order are grouped back together.
+    """
+    rows = (
+        OrderItem.objects.filter(order__in=queryset.order_by().values('pk'))
+        .order_by('order__created_at', 'order_id', 'id')
+        .values_list('order_id', *ORDER_LOOKUPS, *ITEM_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    order_columns = len(ORDER_FIELDS) + 1
+    for _, lines in groupby(rows, key=lambda row: row[0]):
+        first = next(lines)
+        order = dict(zip(ORDER_FIELDS, first[1:order_columns]))
+        order['created_at'] = timezone.localtime(order['created_at']).isoformat()
+        for field in ('subtotal', 'shipping_fee', 'total'):
+            order[field] = str(order[field])
+        order['items'] = [
+            {**dict(zip(ITEM_FIELDS, row[order_columns:])), 'price': str(row[-2]), 'subtotal': str(row[-1])}
+            for row in (first, *lines)
+        ]
+        yield order
+
+
+def write_orders(orders, file, format):
+    """Write orders to `file` one at a time, yielding after each so callers can drain the buffer"""
+    if format == 'csv':
+        writer = csv.DictWriter(file, fieldnames=CSV_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for order in orders:
+            for item in order['items']:
+                writer.writerow({**order, **item, 'subtotal': order['subtotal'], 'line_subtotal': item['subtotal']})
+            yield
+        return
+
+    for order in orders:
+        file.write(json.dumps(order, ensure_ascii=False) + '\n')
+        yield
+
+
+def stream_orders(queryset, format, chunk_size=2000):
+    """Yield the export as text chunks of about FLUSH_SIZE characters"""
+    buffer = io.StringIO()
+    for _ in write_orders(export_orders(queryset, chunk_size), buffer, format):
+        if buffer.tell() >= FLUSH_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def orders_export_response(queryset, format='csv'):
+    response = StreamingHttpResponse(stream_orders(queryset, format), content_type=CONTENT_TYPES[format])
+    filename = f"orders-{timezone.localdate():%Y%m%d}.{format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,218 @@
+import base64
+import json
+import math
+from operator import attrgetter
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.utils.urls import replace_query_param
+from .utils import create_success_response
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on the queryset ordering plus the primary key.
+
+    Pages are fetched with `WHERE (ordering..., id) > (last values...)` instead
+    of OFFSET, so deep pages cost the same as the first one and no COUNT(*)
+    is issued unless the client opts in with `?with_total=true`, in which case
+    the planner's row estimate is reported.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    total_query_param = 'with_total'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        self.total = None
+        if request.query_params.get(self.total_query_param) in ('1', 'true'):
+            self.total = self.get_approximate_count(queryset)
+
+        self.nullable = {
+            field.lstrip('-') for field in self.ordering
+            if self.is_nullable(queryset, field.lstrip('-'))
+        }
+        values, reverse = self.decode_cursor(request, queryset)
+        ordering = self.reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*self.get_order_by(ordering))
+        if values is not None:
+            queryset = queryset.filter(self.get_keyset_filter(ordering, values))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.has_next = has_more if not reverse else True
+        self.has_previous = values is not None if not reverse else has_more
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset):
+        ordering = [
+            field for field in (queryset.query.order_by or queryset.model._meta.ordering)
+            if isinstance(field, str)
+        ]
+        if not any(field.lstrip('-') in ('pk', 'id') for field in ordering):
+            descending = ordering[-1].startswith('-') if ordering else False
+            ordering.append('-pk' if descending else 'pk')
+        return ordering
+
+    def reverse_ordering(self, ordering):
+        return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+    def get_order_by(self, ordering):
+        # NULLs sort as the largest value on every database: last ascending, first descending
+        order_by = []
+        for field in ordering:
+            name = field.lstrip('-')
+            if name not in self.nullable:
+                order_by.append(field)
+            elif field.startswith('-'):
+                order_by.append(F(name).desc(nulls_first=True))
+            else:
+                order_by.append(F(name).asc(nulls_last=True))
+        return order_by
+
+    def get_keyset_filter(self, ordering, values):
+        # (a, b, c) > (x, y, z) expanded so each column may sort in its own direction
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            descending = field.startswith('-')
+            if value is None:
+                # Only non-NULL rows follow a NULL descending; nothing follows one ascending
+                after = Q(**{f'{name}__isnull': False}) if descending else Q(pk__in=[])
+                same = Q(**{f'{name}__isnull': True})
+            else:
+                after = Q(**{f"{name}__{'lt' if descending else 'gt'}": value})
+                if name in self.nullable and not descending:
+                    after |= Q(**{f'{name}__isnull': True})
+                same = Q(**{name: value})
+            condition |= equal & after
+            equal &= same
+        return condition
+
+    def get_position(self, instance):
+        position = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            if isinstance(instance, dict):
+                value = instance[name]
+            else:
+                value = attrgetter(name.replace('__', '.'))(instance)
+            position.append(value if isinstance(value, (int, float, str)) or value is None else str(value))
+        return position
+
+    def encode_cursor(self, position, reverse=False):
+        payload = json.dumps({'v': position, 'r': reverse}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def get_ordering_fields(self, queryset, name):
+        """The fields an ordering name walks through (following __ relations), or its annotation's output field"""
+        if name in queryset.query.annotations:
+            return [queryset.query.annotations[name].output_field]
+        fields = []
+        model = queryset.model
+        for part in name.split('__'):
+            try:
+                field = model._meta.get_field('id' if part == 'pk' else part)
+            except FieldDoesNotExist:
+                return []
+            fields.append(field)
+            model = field.related_model
+        return fields
+
+    def is_nullable(self, queryset, name):
+        fields = self.get_ordering_fields(queryset, name)
+        return any(field.null for field in fields)
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            values, reverse = payload['v'], bool(payload.get('r'))
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            # Cursors are client input; convert each value as its column would so forged ones are a 404
+            values = [
+                self.to_python(queryset, field.lstrip('-'), value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def to_python(self, queryset, name, value):
+        if value is not None and not isinstance(value, (int, float, str)):
+            raise ValueError
+        fields = self.get_ordering_fields(queryset, name)
+        if not fields or value is None:
+            return value
+        field = fields[-1]
+        if field.is_relation:
+            field = field.target_field
+        return field.to_python(value)
+
+    def get_approximate_count(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return queryset.count()
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def get_link(self, instance, reverse):
+        url = self.request.build_absolute_uri()
+        cursor = self.encode_cursor(self.get_position(instance), reverse)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.get_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.get_link(self.page[0], reverse=True)
+
+    def get_pagination_meta(self):
+        return {
+            'total': self.total,
+            'count': len(self.page),
+            'per_page': self.page_size,
+            'current_page': None,
+            'total_pages': math.ceil(self.total / self.page_size) if self.total is not None else None,
+            'links': {
+                'next': self.get_next_link(),
+                'prev': self.get_previous_link()
+            }
+        }
+
+    def get_paginated_response(self, data):
+        return create_success_response(data=data, meta={'pagination': self.get_pagination_meta()})
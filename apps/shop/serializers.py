@@ -12,10 +12,19 @@ class ProductListSerializer(serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     average_rating = serializers.ReadOnlyField()
     likes_count = serializers.ReadOnlyField()
+    is_liked = serializers.SerializerMethodField()
+    thumbnail_srcset = serializers.ReadOnlyField()
 
     class Meta:
         model = Product
-        fields = ['id', 'title', 'price', 'thumbnail', 'category', 'average_rating', 'likes_count']
+        fields = [
+            'id', 'title', 'price', 'thumbnail', 'thumbnail_srcset', 'category',
+            'average_rating', 'likes_count', 'is_liked'
+        ]
+
+    def get_is_liked(self, obj):
+        # Serialized for the shared cache; ProductListView overlays the user's likes with views.with_is_liked
+        return False
 
 
 class ProductDetailSerializer(serializers.ModelSerializer):
@@ -25,11 +34,13 @@ class ProductDetailSerializer(serializers.ModelSerializer):
     reviews_count = serializers.ReadOnlyField()
     likes_count = serializers.ReadOnlyField()
     is_liked = serializers.SerializerMethodField()
+    in_stock = serializers.ReadOnlyField()
+    image_sources = serializers.ReadOnlyField()
 
     class Meta:
         model = Product
         fields = [
-            'id', 'title', 'description', 'price', 'images', 'category',
+            'id', 'title', 'description', 'price', 'images', 'image_sources', 'category',
             'attributes', 'average_rating', 'reviews_count', 'likes_count',
             'is_liked', 'in_stock', 'created_at', 'updated_at'
         ]
@@ -38,29 +49,15 @@ class ProductDetailSerializer(serializers.ModelSerializer):
         return obj.images_list
 
     def get_is_liked(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return ProductLike.objects.filter(user=request.user, product=obj).exists()
+        # Serialized for the shared cache; ProductDetailView overlays the user's like with views.with_is_liked
         return False
 
 
-class CartItemSerializer(serializers.ModelSerializer):
-    product = ProductListSerializer(read_only=True)
-    subtotal = serializers.ReadOnlyField()
+class CartProductSerializer(ProductListSerializer):
+    """Product of a cart line, rendered by shop.cart; keeps the cart's original product fields"""
 
-    class Meta:
-        model = CartItem
-        fields = ['product', 'quantity', 'subtotal']
-
-
-class CartSerializer(serializers.ModelSerializer):
-    items = CartItemSerializer(many=True, read_only=True)
-    total = serializers.ReadOnlyField()
-    items_count = serializers.ReadOnlyField()
-
-    class Meta:
-        model = Cart
-        fields = ['items', 'total', 'items_count']
+    class Meta(ProductListSerializer.Meta):
+        fields = ['id', 'title', 'price', 'thumbnail', 'category', 'average_rating', 'likes_count']
 
 
 class AddToCartSerializer(serializers.Serializer):
@@ -68,16 +65,30 @@ class AddToCartSerializer(serializers.Serializer):
     quantity = serializers.IntegerField(min_value=1, default=1)
 
 
+class BatchAddToCartSerializer(serializers.Serializer):
+    items = AddToCartSerializer(many=True, allow_empty=False, max_length=200)
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
-    product = ProductListSerializer(read_only=True)
+    product = serializers.SerializerMethodField()
 
     class Meta:
         model = OrderItem
         fields = ['product', 'quantity', 'price', 'subtotal']
 
+    def get_product(self, obj):
+        # Rendered from the checkout snapshot; the product may have changed or been deleted since
+        return {
+            'id': obj.product_id,
+            'title': obj.product_title,
+            'thumbnail': obj.product_thumbnail or None,
+            'price': str(obj.price)
+        }
+
 
 class OrderListSerializer(serializers.ModelSerializer):
-    items_count = serializers.ReadOnlyField()
+    # Summed in SQL by OrderQuerySet.with_items_total
+    items_count = serializers.ReadOnlyField(source='items_total')
 
     class Meta:
         model = Order
@@ -96,6 +107,31 @@ class OrderDetailSerializer(serializers.ModelSerializer):
         ]
 
 
+class OrderTransitionSerializer(serializers.Serializer):
+    order_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=10000)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+    tracking_numbers = serializers.DictField(child=serializers.CharField(max_length=100), required=False)
+
+    def validate_tracking_numbers(self, value):
+        try:
+            return {int(order_id): tracking_number for order_id, tracking_number in value.items()}
+        except ValueError:
+            raise serializers.ValidationError("Keys must be order ids.")
+
+
+class OrderExportSerializer(serializers.Serializer):
+    # Not `format`, which DRF reserves for renderer selection
+    file_format = serializers.ChoiceField(choices=['csv', 'jsonl'], default='csv')
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    status = serializers.MultipleChoiceField(choices=Order.STATUS_CHOICES, required=False)
+
+    def validate(self, data):
+        if data.get('date_from') and data.get('date_to') and data['date_from'] > data['date_to']:
+            raise serializers.ValidationError("date_from must not be after date_to.")
+        return data
+
+
 class PlaceOrderSerializer(serializers.Serializer):
     shipping_address = serializers.CharField()
     notes = serializers.CharField(required=False, allow_blank=True)
@@ -145,14 +181,8 @@ class CreateReviewSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
         product_id = self.context['product_id']
 
-        if not OrderItem.objects.filter(
-                order__user=user,
-                product_id=product_id,
-                order__status__in=['delivered', 'processing', 'shipped']
-        ).exists():
+        if not VerifiedPurchase.objects.filter(user=user, product_id=product_id).exists():
             raise serializers.ValidationError("You can only review products you have purchased.")
 
-        if Review.objects.filter(user=user, product_id=product_id).exists():
-            raise serializers.ValidationError("You have already reviewed this product.")
-
+        # Duplicate reviews are rejected by the (product, user) unique constraint on insert
         return data
@@ -0,0 +1,249 @@
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .cache import invalidate_catalog
+from .models import (
+    Cart, CartItem, Order, OrderItem, OrderStatusHistory, Product, StockReservation, VerifiedPurchase
+)
+
+SHIPPING_FEE = Decimal('5.00')
+
+
+class EmptyCartError(Exception):
+    pass
+
+
+class OutOfStockError(Exception):
+    def __init__(self, product_id):
+        super().__init__(f"Product {product_id} does not have enough stock")
+        self.product_id = product_id
+
+
+def get_reservation_expiry():
+    ttl_minutes = getattr(settings, 'STOCK_RESERVATION_TTL_MINUTES', 30)
+    return timezone.now() + timedelta(minutes=ttl_minutes)
+
+
+@transaction.atomic
+def reserve_stock(user, lines):
+    """
+    Hold more units of each product in `lines` ({product_id: quantity}) for
+    the user's cart.
+
+    Each hold is taken with a single conditional UPDATE on Product.reserved,
+    so concurrent carts can never reserve more than the stock on hand, and
+    the reservation rows are then added to with one upsert.
+    """
+    for product_id, quantity in sorted(lines.items()):
+        updated = Product.objects.filter(
+            pk=product_id,
+            stock__gte=F('reserved') + quantity
+        ).update(reserved=F('reserved') + quantity)
+        if not updated:
+            raise OutOfStockError(product_id)
+
+    StockReservation.objects.hold(user.pk, lines, get_reservation_expiry())
+
+
+@transaction.atomic
+def release_stock(user, product_id):
+    reservation = StockReservation.objects.select_for_update().filter(
+        user=user,
+        product_id=product_id
+    ).first()
+    if reservation is None:
+        return
+
+    Product.objects.filter(pk=product_id).update(
+        reserved=Greatest(F('reserved') - reservation.quantity, 0)
+    )
+    reservation.delete()
+
+
+@transaction.atomic
+def place_order(user, shipping_address, notes=''):
+    """
+    Turn the user's cart into an order.
+
+    The cart and its products are locked for the duration of the checkout,
+    stock is decremented with conditional UPDATEs that fail rather than
+    oversell, totals are computed in a single pass over the locked lines, the
+    order items are inserted with one bulk INSERT and the cart is emptied
+    with one DELETE.
+    """
+    try:
+        cart = Cart.objects.select_for_update().get(user=user)
+    except Cart.DoesNotExist:
+        raise EmptyCartError
+
+    cart_items = list(
+        CartItem.objects.filter(cart=cart)
+        .with_products()
+        .select_for_update(of=('self', 'product'))
+        .order_by('product_id')
+    )
+    if not cart_items:
+        raise EmptyCartError
+
+    product_ids = [cart_item.product_id for cart_item in cart_items]
+    reservations = StockReservation.objects.select_for_update().filter(user=user, product_id__in=product_ids)
+    reserved = {reservation.product_id: reservation.quantity for reservation in reservations}
+
+    for cart_item in cart_items:
+        held = reserved.get(cart_item.product_id, 0)
+        # Units held by this user count towards what they may buy; everyone else's holds do not
+        updated = Product.objects.filter(
+            pk=cart_item.product_id,
+            stock__gte=F('reserved') - held + cart_item.quantity
+        ).update(
+            stock=F('stock') - cart_item.quantity,
+            reserved=Greatest(F('reserved') - held, 0)
+        )
+        if not updated:
+            raise OutOfStockError(cart_item.product_id)
+
+    # The products are locked, so their loaded stock is exact; a sold-out one must leave cached listings
+    if any(cart_item.product.stock == cart_item.quantity for cart_item in cart_items):
+        invalidate_catalog()
+
+    order_items = []
+    subtotal = Decimal('0')
+    for cart_item in cart_items:
+        product = cart_item.product
+        line_subtotal = product.price * cart_item.quantity
+        subtotal += line_subtotal
+        order_items.append(OrderItem(
+            product=product,
+            product_title_uz=product.title_uz,
+            product_title_ru=product.title_ru,
+            product_thumbnail=product.thumbnail or '',
+            quantity=cart_item.quantity,
+            price=product.price,
+            subtotal=line_subtotal
+        ))
+
+    order = Order.objects.create(
+        user=user,
+        shipping_address=shipping_address,
+        notes=notes,
+        subtotal=subtotal,
+        shipping_fee=SHIPPING_FEE,
+        total=subtotal + SHIPPING_FEE,
+        status='processing'
+    )
+    for order_item in order_items:
+        order_item.order = order
+    # bulk_create skips OrderItem.save, so subtotal is precomputed above
+    OrderItem.objects.bulk_create(order_items)
+
+    CartItem.objects.filter(cart=cart).delete()
+    StockReservation.objects.filter(user=user, product_id__in=product_ids).delete()
+
+    OrderStatusHistory.objects.create(order=order, to_status=order.status, changed_by=user)
+    VerifiedPurchase.objects.bulk_create(
+        [VerifiedPurchase(user=user, product_id=product_id) for product_id in product_ids],
+        ignore_conflicts=True
+    )
+
+    order._prefetched_objects_cache = {'items': order_items}
+    return order
+
+
+def generate_tracking_number():
+    return f"1Z999AA{uuid.uuid4().hex[:10].upper()}"
+
+
+def restock_orders(order_ids):
+    """
+    Return the units of the given orders to Product.stock, one UPDATE per product.
+
+    Only orders placed by place_order took stock, and those are the ones
+    with its initial history row (no from_status); any other order is left
+    alone so cancelling it cannot create stock.
+    """
+    placed = OrderStatusHistory.objects.filter(order_id__in=order_ids, from_status='').values('order_id')
+    quantities = (
+        OrderItem.objects.filter(order_id__in=placed, product__isnull=False)
+        .values('product')
+        .annotate(quantity=Sum('quantity'))
+        .order_by('product')
+        .values_list('product', 'quantity')
+    )
+    restocked = False
+    for product_id, quantity in quantities:
+        restocked |= bool(Product.objects.filter(pk=product_id).update(stock=F('stock') + quantity))
+    if restocked:
+        # Sold-out products are back in listings
+        invalidate_catalog()
+
+
+@transaction.atomic
+def transition_orders(order_ids, to_status, changed_by=None, tracking_numbers=None, batch_size=1000):
+    """
+    Move the given orders to `to_status` where Order.TRANSITIONS allows it.
+
+    Orders are locked and read with one SELECT and moved with one UPDATE.
+    Orders being shipped without a tracking number get one (taken from
+    `tracking_numbers`, {order_id: number}, or generated) through a batched
+    bulk_update, and the history rows are written with bulk_create. Returns
+    the ids that were moved and the ids that were rejected. Cancelled orders
+    give their units back to stock.
+    """
+    tracking_numbers = tracking_numbers or {}
+    order_ids = set(order_ids)
+    orders = list(
+        Order.objects.select_for_update()
+        .filter(pk__in=order_ids, status__in=Order.source_statuses(to_status))
+        .order_by('pk')
+        .values_list('pk', 'status', 'tracking_number')
+    )
+    updated = [pk for pk, _, _ in orders]
+    rejected = sorted(order_ids - set(updated))
+    if not orders:
+        return {'updated': updated, 'rejected': rejected}
+
+    now = timezone.now()
+    Order.objects.filter(pk__in=updated).update(status=to_status, updated_at=now)
+
+    assigned = {}
+    if to_status == 'shipped':
+        for pk, _, tracking_number in orders:
+            if pk in tracking_numbers or not tracking_number:
+                assigned[pk] = tracking_numbers.get(pk) or generate_tracking_number()
+        Order.objects.bulk_update(
+            [Order(pk=pk, tracking_number=tracking_number) for pk, tracking_number in assigned.items()],
+            ['tracking_number'],
+            batch_size=batch_size
+        )
+
+    if to_status == 'cancelled':
+        restock_orders(updated)
+
+    # Keep VerifiedPurchase in step with orders entering or leaving a reviewable status
+    reviewable = set(Order.REVIEWABLE_STATUSES)
+    if to_status in reviewable:
+        VerifiedPurchase.objects.grant_for_orders(
+            [pk for pk, from_status, _ in orders if from_status not in reviewable]
+        )
+    else:
+        VerifiedPurchase.objects.revoke_for_orders(
+            [pk for pk, from_status, _ in orders if from_status in reviewable]
+        )
+
+    OrderStatusHistory.objects.bulk_create([
+        OrderStatusHistory(
+            order_id=pk,
+            from_status=from_status,
+            to_status=to_status,
+            tracking_number=assigned.get(pk, ''),
+            changed_by=changed_by
+        )
+        for pk, from_status, _ in orders
+    ], batch_size=batch_size)
+
+    return {'updated': updated, 'rejected': rejected}
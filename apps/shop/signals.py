@@ -1,7 +1,11 @@
-from django.db.models.signals import post_save
+from django.db import connection, connections, transaction
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile, Cart
+from .models import ORDER_NUMBER_SEQUENCE, UserProfile, Cart, Category, Product, ProductImage, ProductLike, Review
+from .cache import invalidate_catalog
+from .images import delete_derivatives
+from .tasks import generate_image_derivatives
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -12,4 +16,77 @@ def create_user_profile(sender, instance, created, **kwargs):
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
     if hasattr(instance, 'userprofile'):
-        instance.userprofile.save()
\ No newline at end of file
+        instance.userprofile.save()
+
+@receiver(post_save, sender=Review)
+def update_review_counters(sender, instance, created, **kwargs):
+    if created:
+        Product.objects.add_review(instance.product_id, instance.rating)
+    else:
+        # The previous rating is unknown here, so recount this product only
+        Product.objects.filter(pk=instance.product_id).rebuild_counters()
+
+@receiver(post_delete, sender=Review)
+def remove_review_counters(sender, instance, **kwargs):
+    Product.objects.remove_review(instance.product_id, instance.rating)
+
+@receiver(post_save, sender=ProductLike)
+def increment_likes_count(sender, instance, created, **kwargs):
+    if created:
+        Product.objects.add_likes(instance.product_id, 1)
+
+@receiver(post_delete, sender=ProductLike)
+def decrement_likes_count(sender, instance, **kwargs):
+    Product.objects.add_likes(instance.product_id, -1)
+
+@receiver(post_save, sender=Product)
+def update_product_attribute_values(sender, instance, **kwargs):
+    Product.objects.filter(pk=instance.pk).rebuild_attribute_values()
+
+@receiver(post_save, sender=Product)
+def update_product_search_vector(sender, instance, **kwargs):
+    if connection.vendor == 'postgresql':
+        Product.objects.filter(pk=instance.pk).update_search_vector()
+
+@receiver(pre_save, sender=ProductImage)
+def demote_other_primary_images(sender, instance, **kwargs):
+    # Cleared before the insert/update so the single-primary unique index is never violated
+    if instance.is_primary:
+        ProductImage.objects.filter(product_id=instance.product_id, is_primary=True).exclude(
+            pk=instance.pk
+        ).update(is_primary=False)
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def update_primary_image(sender, instance, **kwargs):
+    Product.objects.filter(pk=instance.product_id).refresh_primary_images()
+
+@receiver(post_save, sender=ProductImage)
+def queue_image_derivatives(sender, instance, **kwargs):
+    # Derivatives record the file they were made from, so only new or replaced uploads are queued
+    if instance.image and instance.derivatives.get('source') != instance.image.name:
+        transaction.on_commit(lambda: generate_image_derivatives.delay(instance.pk))
+
+@receiver(post_delete, sender=ProductImage)
+def remove_image_derivatives(sender, instance, **kwargs):
+    transaction.on_commit(lambda: delete_derivatives(instance.derivatives))
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_catalog_cache(sender, **kwargs):
+    # ProductLike is left out: bumping the version on every like would empty the whole
+    # catalog cache, so cached likes_count values are allowed to lag until they expire
+    invalidate_catalog()
+
+@receiver(post_migrate)
+def create_order_number_sequence(sender, using, **kwargs):
+    # The app ships no migrations of its own, so the sequence behind Order numbers is created here
+    if sender.name == 'shop' and connections[using].vendor == 'postgresql':
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS {ORDER_NUMBER_SEQUENCE}')
@@ -0,0 +1,92 @@
+from celery import shared_task
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+import logging
+from .cart import get_cart_storage
+from .images import process_image
+from .likes import get_like_storage
+from .models import Product, StockReservation
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def expire_stock_reservations(batch_size=1000):
+    """Return stock held by expired cart reservations"""
+    try:
+        expired_count = 0
+
+        while True:
+            with transaction.atomic():
+                # skip_locked leaves reservations that a checkout is working on
+                reservations = list(
+                    StockReservation.objects.select_for_update(skip_locked=True)
+                    .filter(expires_at__lt=timezone.now())
+                    .order_by('product_id')
+                    .values_list('pk', 'product_id', 'quantity')[:batch_size]
+                )
+                if not reservations:
+                    break
+
+                released = {}
+                for _, product_id, quantity in reservations:
+                    released[product_id] = released.get(product_id, 0) + quantity
+
+                for product_id, quantity in released.items():
+                    Product.objects.filter(pk=product_id).update(
+                        reserved=Greatest(F('reserved') - quantity, 0)
+                    )
+                StockReservation.objects.filter(pk__in=[pk for pk, _, _ in reservations]).delete()
+
+            expired_count += len(reservations)
+
+        logger.info(f"Expired {expired_count} stock reservations")
+        return {"expired_count": expired_count}
+
+    except Exception as e:
+        logger.error(f"Error expiring stock reservations: {e}")
+        return {"error": str(e)}
+
+
+@shared_task
+def flush_carts():
+    """Write carts changed in the cart storage backend through to Cart/CartItem"""
+    try:
+        flushed_count = get_cart_storage().flush_dirty()
+
+        logger.info(f"Flushed {flushed_count} carts")
+        return {"flushed_count": flushed_count}
+
+    except Exception as e:
+        logger.error(f"Error flushing carts: {e}")
+        return {"error": str(e)}
+
+
+@shared_task
+def flush_likes():
+    """Write like toggles buffered by the like storage backend through to ProductLike"""
+    try:
+        flushed_count = get_like_storage().flush()
+
+        logger.info(f"Flushed {flushed_count} like toggles")
+        return {"flushed_count": flushed_count}
+
+    except Exception as e:
+        logger.error(f"Error flushing likes: {e}")
+        return {"error": str(e)}
+
+
+@shared_task
+def generate_image_derivatives(image_id):
+    """Generate the resized WebP/JPEG copies of a ProductImage"""
+    try:
+        processed = process_image(image_id)
+
+        logger.info(f"Generated derivatives for product image {image_id}")
+        return {"image_id": image_id, "processed": processed}
+
+    except Exception as e:
+        logger.error(f"Error generating derivatives for product image {image_id}: {e}")
+        return {"error": str(e)}
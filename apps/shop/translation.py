@@ -0,0 +1,17 @@
+from modeltranslation.translator import register, TranslationOptions
+from .models import Category, OrderItem, Product
+
+
+@register(Category)
+class CategoryTranslationOptions(TranslationOptions):
+    fields = ('name',)
+
+
+@register(Product)
+class ProductTranslationOptions(TranslationOptions):
+    fields = ('title', 'description')
+
+
+@register(OrderItem)
+class OrderItemTranslationOptions(TranslationOptions):
+    fields = ('product_title',)
@@ -1,88 +1,135 @@
 from rest_framework import generics, status, filters
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
-from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.db.models import Q
 from .models import *
 from .serializers import *
-from .filters import ProductFilter
+from . import services
+from .cart import GuestCartStore, get_cart_storage
+from .filters import ProductFilter, ProductSearchFilter
+from .likes import get_like_storage
+from .order_export import orders_export_response
+from .pagination import KeysetPagination
+from .cache import catalog_cache_key, get_cached, set_cached
 from .utils import create_success_response, create_error_response
 
 
+def with_is_liked(request, products):
+    """
+    Copy serialized products with is_liked set for the current user in one
+    query. Serializers always render is_liked as False so cached payloads
+    stay user-independent; this overlay is the only source of the real value.
+    """
+    liked = get_like_storage().liked_product_ids(request.user, [product['id'] for product in products])
+    return [{**product, 'is_liked': product['id'] in liked} for product in products]
+
+
 class ProductListView(generics.ListAPIView):
-    queryset = Product.objects.filter(in_stock=True)
+    queryset = Product.objects.available().for_listing()
     serializer_class = ProductListSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = KeysetPagination
+    # Search runs after ordering so it can rank results when no ordering is requested
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, ProductSearchFilter]
     filterset_class = ProductFilter
     search_fields = ['title', 'description']
     ordering_fields = ['price', 'created_at', 'title']
     ordering = ['-created_at']
 
     def list(self, request, *args, **kwargs):
+        cache_key = catalog_cache_key('product-list', request.query_params, host=request.get_host())
+        data = get_cached(cache_key)
+        if data is None:
+            # Cached with is_liked unset so the payload is user-independent
+            data = self.get_list_response(request).data
+            set_cached(cache_key, data)
+
+        data = dict(data)
+        data['data'] = with_is_liked(request, data['data'])
+        return Response(data)
+
+    def get_list_response(self, request):
         queryset = self.filter_queryset(self.get_queryset())
         page = self.paginate_queryset(queryset)
 
         if page is not None:
             serializer = self.get_serializer(page, many=True)
-            paginated_response = self.get_paginated_response(serializer.data)
-            return create_success_response(
-                data=paginated_response.data['results'],
-                meta={'pagination': {
-                    'total': paginated_response.data['count'],
-                    'count': len(paginated_response.data['results']),
-                    'per_page': self.paginator.page_size,
-                    'current_page': self.paginator.page.number,
-                    'total_pages': self.paginator.page.paginator.num_pages,
-                    'links': {
-                        'next': paginated_response.data['next'],
-                        'prev': paginated_response.data['previous']
+            response = self.get_paginated_response(serializer.data)
+        else:
+            serializer = self.get_serializer(queryset, many=True)
+            response = create_success_response(data=serializer.data)
+
+        if request.query_params.get('attribute_counts') in ('1', 'true'):
+            response.data.setdefault('meta', {})['attribute_counts'] = queryset.attribute_value_counts()
+        return response
+
+
+class ProductFacetsView(generics.GenericAPIView):
+    """Category, price band and attribute counts for the ProductListView filters"""
+    queryset = Product.objects.available()
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter]
+    filterset_class = ProductFilter
+    search_fields = ['title', 'description']
+    attribute_values_limit = 10
+
+    def get(self, request, *args, **kwargs):
+        cache_key = catalog_cache_key('product-facets', request.query_params)
+        data = get_cached(cache_key)
+
+        if data is None:
+            queryset = self.filter_queryset(self.get_queryset())
+            data = {
+                'categories': [
+                    {
+                        'id': row['category_id'],
+                        'name': row['category__name'],
+                        'slug': row['category__slug'],
+                        'count': row['count']
                     }
-                }}
-            )
+                    for row in queryset.category_counts()
+                ],
+                'price': queryset.price_bucket_counts(
+                    getattr(settings, 'PRODUCT_PRICE_BUCKETS', [0, 50, 100, 250, 500, 1000])
+                ),
+                'attributes': queryset.attribute_value_counts(limit=self.attribute_values_limit),
+            }
+            set_cached(cache_key, data)
 
-        serializer = self.get_serializer(queryset, many=True)
-        return create_success_response(data=serializer.data)
+        return create_success_response(data=data)
 
 
 class ProductDetailView(generics.RetrieveAPIView):
-    queryset = Product.objects.all()
+    queryset = Product.objects.select_related('category').prefetch_related('images')
     serializer_class = ProductDetailSerializer
 
     def retrieve(self, request, *args, **kwargs):
-        try:
-            instance = self.get_object()
-            serializer = self.get_serializer(instance, context={'request': request})
-            return create_success_response(data=serializer.data)
-        except Product.DoesNotExist:
-            return create_error_response(
-                code="PRODUCT_NOT_FOUND",
-                message="Product not found",
-                status_code=status.HTTP_404_NOT_FOUND
-            )
+        cache_key = catalog_cache_key('product-detail', pk=kwargs['pk'])
+        data = get_cached(cache_key)
+
+        if data is None:
+            try:
+                instance = self.get_object()
+            except Product.DoesNotExist:
+                return create_error_response(
+                    code="PRODUCT_NOT_FOUND",
+                    message="Product not found",
+                    status_code=status.HTTP_404_NOT_FOUND
+                )
+            # Serialized without the request so the cached payload is user-independent
+            data = self.get_serializer(instance, context={}).data
+            set_cached(cache_key, data)
+
+        return create_success_response(data=with_is_liked(request, [data])[0])
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def like_product(request, id):
     try:
-        product = get_object_or_404(Product, id=id)
-        like, created = ProductLike.objects.get_or_create(
-            user=request.user,
-            product=product
-        )
-
-        if not created:
-            like.delete()
-            liked = False
-        else:
-            liked = True
-
-        return create_success_response(data={
-            'liked': liked,
-            'likes_count': product.likes_count
-        })
+        liked, likes_count = get_like_storage().toggle(request.user, id)
     except Product.DoesNotExist:
         return create_error_response(
             code="PRODUCT_NOT_FOUND",
@@ -90,17 +137,62 @@ def like_product(request, id):
             status_code=status.HTTP_404_NOT_FOUND
         )
 
+    return create_success_response(data={
+        'liked': liked,
+        'likes_count': likes_count
+    })
+
+
+def get_guest_cart(request):
+    """Resolve the guest cart from the X-Cart-Token header, issuing a new token when needed"""
+    store = GuestCartStore()
+    token = request.headers.get('X-Cart-Token')
+    cart_id = store.get_cart_id(token)
+    if cart_id is None:
+        token = store.issue_token()
+        cart_id = store.get_cart_id(token)
+    return store, cart_id, token
+
+
+def render_cart(request):
+    if request.user.is_authenticated:
+        return create_success_response(data=get_cart_storage().render(request.user))
+
+    store, cart_id, token = get_guest_cart(request)
+    return create_success_response(data=store.render(cart_id), meta={'cart_token': token})
+
+
+def add_lines_to_cart(request, lines):
+    if not request.user.is_authenticated:
+        # Guest lines hold no stock until they are merged on login
+        store, cart_id, token = get_guest_cart(request)
+        store.add(cart_id, lines)
+        return create_success_response(data=store.render(cart_id), meta={'cart_token': token})
+
+    storage = get_cart_storage()
+    try:
+        with transaction.atomic():
+            services.reserve_stock(request.user, lines)
+            storage.add(request.user, lines)
+    except services.OutOfStockError as e:
+        return create_error_response(
+            code="OUT_OF_STOCK",
+            message="Not enough stock for the requested quantity",
+            details={'product_id': e.product_id},
+            status_code=status.HTTP_409_CONFLICT
+        )
+
+    return create_success_response(data=storage.render(request.user))
+
 
 @api_view(['GET'])
-@permission_classes([IsAuthenticated])
+@permission_classes([AllowAny])
 def view_cart(request):
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    serializer = CartSerializer(cart)
-    return create_success_response(data=serializer.data)
+    return render_cart(request)
 
 
 @api_view(['POST'])
-@permission_classes([IsAuthenticated])
+@permission_classes([AllowAny])
 def add_to_cart(request):
     serializer = AddToCartSerializer(data=request.data)
     if serializer.is_valid():
@@ -108,7 +200,7 @@ def add_to_cart(request):
         quantity = serializer.validated_data['quantity']
 
         try:
-            product = Product.objects.get(id=product_id, in_stock=True)
+            product = Product.objects.available().get(id=product_id)
         except Product.DoesNotExist:
             return create_error_response(
                 code="PRODUCT_NOT_FOUND",
@@ -116,19 +208,35 @@ def add_to_cart(request):
                 status_code=status.HTTP_404_NOT_FOUND
             )
 
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            defaults={'quantity': quantity}
-        )
+        return add_lines_to_cart(request, {product.id: quantity})
+
+    return create_error_response(
+        code="INVALID_REQUEST",
+        message="The provided data is invalid",
+        details=serializer.errors
+    )
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def add_cart_items(request):
+    serializer = BatchAddToCartSerializer(data=request.data)
+    if serializer.is_valid():
+        lines = {}
+        for item in serializer.validated_data['items']:
+            lines[item['product_id']] = lines.get(item['product_id'], 0) + item['quantity']
 
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
+        available = set(Product.objects.available().filter(id__in=lines).values_list('id', flat=True))
+        missing = sorted(set(lines) - available)
+        if missing:
+            return create_error_response(
+                code="PRODUCT_NOT_FOUND",
+                message="Some products were not found or are out of stock",
+                details={'product_ids': missing},
+                status_code=status.HTTP_404_NOT_FOUND
+            )
 
-        cart_serializer = CartSerializer(cart)
-        return create_success_response(data=cart_serializer.data)
+        return add_lines_to_cart(request, lines)
 
     return create_error_response(
         code="INVALID_REQUEST",
@@ -138,54 +246,51 @@ def add_to_cart(request):
 
 
 @api_view(['DELETE'])
-@permission_classes([IsAuthenticated])
+@permission_classes([AllowAny])
 def remove_from_cart(request, product_id):
-    try:
-        cart = Cart.objects.get(user=request.user)
-        cart_item = CartItem.objects.get(cart=cart, product_id=product_id)
-        cart_item.delete()
+    if not request.user.is_authenticated:
+        store, cart_id, token = get_guest_cart(request)
+        if not store.remove(cart_id, product_id):
+            return create_error_response(
+                code="PRODUCT_NOT_FOUND",
+                message="Product not found in cart",
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        return create_success_response(data=store.render(cart_id), meta={'cart_token': token})
 
-        cart_serializer = CartSerializer(cart)
-        return create_success_response(data=cart_serializer.data)
+    storage = get_cart_storage()
+    with transaction.atomic():
+        if not storage.remove(request.user, product_id):
+            return create_error_response(
+                code="PRODUCT_NOT_FOUND",
+                message="Product not found in cart",
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        services.release_stock(request.user, product_id)
 
-    except (Cart.DoesNotExist, CartItem.DoesNotExist):
-        return create_error_response(
-            code="PRODUCT_NOT_FOUND",
-            message="Product not found in cart",
-            status_code=status.HTTP_404_NOT_FOUND
-        )
+    return create_success_response(data=storage.render(request.user))
 
 
 class OrderListView(generics.ListAPIView):
     serializer_class = OrderListSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['status']
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return Order.objects.filter(user=self.request.user).order_by('-created_at', '-id')
 
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
+        # Rows are serialized straight from values() with the item quantities summed in SQL
+        queryset = self.filter_queryset(self.get_queryset()).with_items_total().values(
+            'id', 'order_number', 'created_at', 'status', 'total', 'items_total'
+        )
         page = self.paginate_queryset(queryset)
 
         if page is not None:
             serializer = self.get_serializer(page, many=True)
-            paginated_response = self.get_paginated_response(serializer.data)
-            return create_success_response(
-                data=paginated_response.data['results'],
-                meta={'pagination': {
-                    'total': paginated_response.data['count'],
-                    'count': len(paginated_response.data['results']),
-                    'per_page': self.paginator.page_size,
-                    'current_page': self.paginator.page.number,
-                    'total_pages': self.paginator.page.paginator.num_pages,
-                    'links': {
-                        'next': paginated_response.data['next'],
-                        'prev': paginated_response.data['previous']
-                    }
-                }}
-            )
+            return self.get_paginated_response(serializer.data)
 
         serializer = self.get_serializer(queryset, many=True)
         return create_success_response(data=serializer.data)
@@ -196,50 +301,34 @@ class OrderListView(generics.ListAPIView):
 def place_order(request):
     serializer = PlaceOrderSerializer(data=request.data)
     if serializer.is_valid():
+        storage = get_cart_storage()
+        storage.persist(request.user.pk)
         try:
-            cart = Cart.objects.get(user=request.user)
-            if not cart.items.exists():
-                return create_error_response(
-                    code="EMPTY_CART",
-                    message="Cart is empty",
-                    status_code=status.HTTP_400_BAD_REQUEST
-                )
-
-            # Create order
-            order = Order.objects.create(
-                user=request.user,
+            order = services.place_order(
+                request.user,
                 shipping_address=serializer.validated_data['shipping_address'],
-                notes=serializer.validated_data.get('notes', ''),
-                subtotal=cart.total,
-                total=cart.total + 5.00,  # Add shipping fee
-                status='processing'
-            )
-
-            # Create order items
-            for cart_item in cart.items.all():
-                OrderItem.objects.create(
-                    order=order,
-                    product=cart_item.product,
-                    quantity=cart_item.quantity,
-                    price=cart_item.product.price,
-                    subtotal=cart_item.subtotal
-                )
-
-            # Clear cart
-            cart.items.all().delete()
-
-            order_serializer = OrderDetailSerializer(order)
-            return create_success_response(
-                data=order_serializer.data,
-                status_code=status.HTTP_201_CREATED
+                notes=serializer.validated_data.get('notes', '')
             )
-
-        except Cart.DoesNotExist:
+        except services.EmptyCartError:
             return create_error_response(
                 code="EMPTY_CART",
                 message="Cart is empty",
                 status_code=status.HTTP_400_BAD_REQUEST
             )
+        except services.OutOfStockError as e:
+            return create_error_response(
+                code="OUT_OF_STOCK",
+                message="Some products in the cart are out of stock",
+                details={'product_id': e.product_id},
+                status_code=status.HTTP_409_CONFLICT
+            )
+
+        storage.clear(request.user)
+        order_serializer = OrderDetailSerializer(order)
+        return create_success_response(
+            data=order_serializer.data,
+            status_code=status.HTTP_201_CREATED
+        )
 
     return create_error_response(
         code="INVALID_REQUEST",
@@ -248,12 +337,57 @@ def place_order(request):
     )
 
 
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def transition_orders(request):
+    serializer = OrderTransitionSerializer(data=request.data)
+    if serializer.is_valid():
+        result = services.transition_orders(
+            serializer.validated_data['order_ids'],
+            serializer.validated_data['status'],
+            changed_by=request.user,
+            tracking_numbers=serializer.validated_data.get('tracking_numbers')
+        )
+        return create_success_response(data={
+            'updated_count': len(result['updated']),
+            'rejected_ids': result['rejected']
+        })
+
+    return create_error_response(
+        code="INVALID_REQUEST",
+        message="The provided data is invalid",
+        details=serializer.errors
+    )
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_orders(request):
+    # QueryDict.getlist keeps repeated ?status= values for the multiple choice field
+    serializer = OrderExportSerializer(data={
+        **request.query_params.dict(),
+        'status': request.query_params.getlist('status')
+    })
+    if not serializer.is_valid():
+        return create_error_response(
+            code="INVALID_REQUEST",
+            message="The provided filters are invalid",
+            details=serializer.errors
+        )
+
+    filters = serializer.validated_data
+    orders = Order.objects.created_between(filters.get('date_from'), filters.get('date_to'))
+    if filters.get('status'):
+        orders = orders.filter(status__in=filters['status'])
+    return orders_export_response(orders, filters['file_format'])
+
+
 class OrderDetailView(generics.RetrieveAPIView):
     serializer_class = OrderDetailSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return Order.objects.filter(user=self.request.user).prefetch_related('items')
 
     def retrieve(self, request, *args, **kwargs):
         try:
@@ -306,33 +440,72 @@ def update_profile(request):
         )
 
 
+class ProductReviewListView(generics.ListAPIView):
+    serializer_class = ReviewSerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        return (
+            Review.objects.filter(product_id=self.kwargs['id'])
+            .select_related('user')
+            .only('id', 'product_id', 'rating', 'comment', 'created_at', 'user__id', 'user__first_name', 'user__username')
+            .order_by('-created_at', '-id')
+        )
+
+    def list(self, request, *args, **kwargs):
+        cache_key = catalog_cache_key('product-reviews', request.query_params, host=request.get_host(), pk=kwargs['id'])
+        data = get_cached(cache_key)
+        if data is not None:
+            return Response(data)
+
+        product = Product.objects.filter(pk=kwargs['id']).only(
+            'rating_sum', 'reviews_count', *(f'rating_{rating}_count' for rating in RATING_VALUES)
+        ).first()
+        if product is None:
+            return create_error_response(
+                code="PRODUCT_NOT_FOUND",
+                message="Product not found",
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+
+        page = self.paginate_queryset(self.get_queryset())
+        response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        response.data['meta']['summary'] = {
+            'average_rating': product.average_rating,
+            'reviews_count': product.reviews_count,
+            'rating_histogram': product.rating_histogram
+        }
+        set_cached(cache_key, response.data)
+        return response
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def create_review(request, id):
-    try:
-        product = get_object_or_404(Product, id=id)
-        serializer = CreateReviewSerializer(
-            data=request.data,
-            context={'request': request, 'product_id': id}
-        )
+    serializer = CreateReviewSerializer(
+        data=request.data,
+        context={'request': request, 'product_id': id}
+    )
 
-        if serializer.is_valid():
-            review = serializer.save(user=request.user, product=product)
-            review_serializer = ReviewSerializer(review)
-            return create_success_response(
-                data=review_serializer.data,
-                status_code=status.HTTP_201_CREATED
+    if serializer.is_valid():
+        try:
+            with transaction.atomic():
+                review = serializer.save(user=request.user, product_id=id)
+        except IntegrityError:
+            return create_error_response(
+                code="INVALID_REQUEST",
+                message="The provided data is invalid",
+                details={'non_field_errors': ["You have already reviewed this product."]}
             )
 
-        return create_error_response(
-            code="INVALID_REQUEST",
-            message="The provided data is invalid",
-            details=serializer.errors
+        review_serializer = ReviewSerializer(review)
+        return create_success_response(
+            data=review_serializer.data,
+            status_code=status.HTTP_201_CREATED
         )
 
-    except Product.DoesNotExist:
-        return create_error_response(
-            code="PRODUCT_NOT_FOUND",
-            message="Product not found",
-            status_code=status.HTTP_404_NOT_FOUND
-        )
\ No newline at end of file
+    return create_error_response(
+        code="INVALID_REQUEST",
+        message="The provided data is invalid",
+        details=serializer.errors
+    )
\ No newline at end of file
@@ -2,6 +2,7 @@ import os
 import sys
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
 from django.utils.translation import gettext_lazy as _
 from dotenv import load_dotenv
 
@@ -14,6 +15,8 @@ load_dotenv(os.path.join(BASE_DIR, ".env"))
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.environ.get("SECRET_KEY")
 REDIS_PASSWORD = os.environ.get("REDIS_PASSWORD", "")
+REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
+REDIS_PORT = os.environ.get("REDIS_PORT", "6379")
 
 # Application definition
 BASE_APPS = [
@@ -53,6 +56,8 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+CORS_ALLOW_HEADERS = (*default_headers, "x-cart-token")
+
 ROOT_URLCONF = "config.urls"
 
 TEMPLATES = [
@@ -83,6 +88,64 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://github.com/jazzband/django-redis
+
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": f"redis://{REDIS_HOST}:{REDIS_PORT}/1",
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "PASSWORD": REDIS_PASSWORD or None,
+            # Catalog reads fall back to the database while Redis is down
+            "IGNORE_EXCEPTIONS": True,
+        },
+    }
+}
+DJANGO_REDIS_LOG_IGNORED_EXCEPTIONS = True
+
+CATALOG_CACHE_TIMEOUT = 60 * 5
+
+# Widths of the WebP/JPEG copies generated for each ProductImage
+IMAGE_DERIVATIVE_WIDTHS = [320, 640, 1280]
+
+# Lower bounds of the price bands returned by the product facets endpoint
+PRODUCT_PRICE_BUCKETS = [0, 50, 100, 250, 500, 1000, 2500]
+
+# Celery
+# https://docs.celeryq.dev/en/stable/userguide/periodic-tasks.html
+
+CELERY_BEAT_SCHEDULE = {
+    "expire-stock-reservations": {
+        "task": "shop.tasks.expire_stock_reservations",
+        "schedule": 60.0,
+    },
+    "flush-carts": {
+        "task": "shop.tasks.flush_carts",
+        "schedule": 60.0 * 5,
+    },
+    "flush-likes": {
+        "task": "shop.tasks.flush_likes",
+        "schedule": 60.0,
+    },
+}
+
+STOCK_RESERVATION_TTL_MINUTES = 30
+# Quantity backfill_stock gives products that only had in_stock=True
+STOCK_BACKFILL_QUANTITY = 100
+
+# "shop.cart.RedisCartStorage" keeps cart lines in Redis and writes them
+# to Cart/CartItem at checkout and from the flush-carts task
+CART_STORAGE_BACKEND = "shop.cart.DatabaseCartStorage"
+CART_REDIS_TTL = 60 * 60 * 24 * 30
+GUEST_CART_TTL = 60 * 60 * 24 * 7
+
+# "shop.likes.RedisLikeStorage" applies like toggles in Redis and writes
+# them to ProductLike from the flush-likes task
+LIKE_STORAGE_BACKEND = "shop.likes.DatabaseLikeStorage"
+LIKES_REDIS_TTL = 60 * 60 * 24
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 